@@ -0,0 +1 @@
+"""מדידות ביצועים ומחולל קלט סינתטי (python -m benchmarks.run)"""
@@ -0,0 +1,167 @@
+"""מדידת זמן ריצה וזיכרון שיא לכל שלב בנתיב השיבוץ, על פני כמה גדלי קלט
+
+    python -m benchmarks.run --sizes small,medium --json results.json
+    python -m benchmarks.run --sizes medium --compare results.json --tolerance 0.25
+
+גודל הוא שם מוגדר מראש (small / medium / large) או EMPLOYEESxDATESxSTATIONS, למשל 1000x30x12.
+עם --compare התוכנית מחזירה קוד יציאה 1 אם שלב כלשהו איטי מהבסיס מעבר לסף.
+"""
+
+import argparse
+import io
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from shibutz import (
+    FORMAT_PARQUET, CandidateIndex, auto_assign, auto_assign_optimal, build_board_html,
+    get_day_name, load_tables, named_buffer, table_bytes, validate_dataframes
+)
+
+from .synthetic import generate_inputs
+
+SIZE_PRESETS: Dict[str, Tuple[int, int, int]] = {
+    'small': (100, 14, 4),
+    'medium': (500, 30, 10),
+    'large': (2000, 60, 25)
+}
+
+class StageResult(NamedTuple):
+    """תוצאת מדידה של שלב אחד בגודל קלט אחד"""
+    size: str
+    stage: str
+    best_ms: float
+    median_ms: float
+    peak_kb: float
+
+def parse_size(size: str) -> Tuple[int, int, int]:
+    """שם מוגדר מראש או EMPLOYEESxDATESxSTATIONS"""
+    if size in SIZE_PRESETS:
+        return SIZE_PRESETS[size]
+    try:
+        employees, dates, stations = (int(part) for part in size.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {size}")
+    return employees, dates, stations
+
+def measure(fn: Callable[[], object], repeat: int) -> Tuple[float, float, float]:
+    """זמן (הטוב ביותר וחציון, במילישניות) וזיכרון שיא (KB) של קריאה לפונקציה"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+
+    # מדידת הזיכרון בהרצה נפרדת - tracemalloc מאט את הריצה ומעוות את הזמנים
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), statistics.median(times), peak / 1024
+
+def build_stages(employees: int, n_dates: int, stations: int,
+                 seed: int = 0) -> List[Tuple[str, Callable[[], object]]]:
+    """השלבים הנמדדים, על קלט סינתטי אחד; כל שלב מקבל את תוצרי השלב הקודם"""
+    req_df, shi_df = generate_inputs(employees, n_dates, stations, seed=seed)
+    req_csv = req_df.to_csv(index=False).encode('utf-8-sig')
+    shi_csv = shi_df.to_csv(index=False).encode('utf-8-sig')
+    req_parquet = table_bytes(req_df, FORMAT_PARQUET)
+
+    upload = load_tables(io.BytesIO(req_csv), io.BytesIO(shi_csv))
+    if upload.errors:
+        raise RuntimeError(f"synthetic input failed validation: {upload.errors}")
+    index = upload.index
+    schedule, _ = auto_assign(upload.dates, upload.shi_df, upload.req_df, {}, index=index)
+    raw_dates = list(req_df['תאריך מבוקש'])
+
+    stages = [
+        ('load_tables', lambda: load_tables(io.BytesIO(req_csv), io.BytesIO(shi_csv))),
+        # אותן בקשות מ-Parquet (למשל טעינה חוזרת של קובץ חודשי שכבר הומר)
+        ('load_tables_parquet', lambda: load_tables(named_buffer(req_parquet, 'requests.parquet'),
+                                                    io.BytesIO(shi_csv))),
+        ('validate_dataframes', lambda: validate_dataframes(upload.req_df, upload.shi_df)),
+        # כמו לולאת התצוגה המקורית: שם יום לכל שורת בקשה
+        ('get_day_name', lambda: [get_day_name(d) for d in raw_dates]),
+        ('candidate_index', lambda: CandidateIndex(upload.req_df)),
+        ('auto_assign', lambda: auto_assign(upload.dates, upload.shi_df, upload.req_df, {},
+                                            index=index)),
+        ('auto_assign_optimal', lambda: auto_assign_optimal(upload.dates, upload.shi_df,
+                                                            upload.req_df, {}, index=index)),
+        # הלוח המלא כ-HTML - החלק בלולאת התצוגה שאינו תלוי ב-Streamlit
+        ('build_board_html', lambda: build_board_html(upload.dates, upload.day_names,
+                                                      upload.shi_df, schedule, set()))
+    ]
+    return stages
+
+def run(sizes: List[str], repeat: int = 3, stages: Optional[List[str]] = None,
+        seed: int = 0) -> List[StageResult]:
+    results = []
+    for size in sizes:
+        employees, n_dates, stations = parse_size(size)
+        for stage, fn in build_stages(employees, n_dates, stations, seed):
+            if stages and stage not in stages:
+                continue
+            best, median, peak = measure(fn, repeat)
+            results.append(StageResult(size, stage, best, median, peak))
+            print(f"{size:>12} {stage:<22} {best:>10.1f} {median:>10.1f} {peak:>12.0f}",
+                  flush=True)
+    return results
+
+def compare(results: List[StageResult], baseline_path: str, tolerance: float) -> List[str]:
+    """שלבים שהזמן הטוב ביותר שלהם חורג מהבסיס ביותר מהסף היחסי"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['size'], r['stage']): r for r in json.load(f)}
+    regressions = []
+    for result in results:
+        base = baseline.get((result.size, result.stage))
+        if base is None:
+            continue
+        limit = base['best_ms'] * (1 + tolerance)
+        if result.best_ms > limit:
+            regressions.append(
+                f"{result.size} {result.stage}: {result.best_ms:.1f}ms "
+                f"(baseline {base['best_ms']:.1f}ms, limit {limit:.1f}ms)"
+            )
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="מדידות ביצועים למנוע השיבוץ")
+    parser.add_argument("--sizes", default="small,medium",
+                        help="גדלים מופרדים בפסיק (small/medium/large או EMPxDATESxSTATIONS)")
+    parser.add_argument("--stages", help="שלבים מופרדים בפסיק (ברירת מחדל: כולם)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="שמירת התוצאות לקובץ JSON")
+    parser.add_argument("--compare", help="קובץ JSON של הרצה קודמת להשוואה")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="חריגה יחסית מותרת מהבסיס (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(',') if s.strip()]
+    for size in sizes:
+        parse_size(size)
+    stages = [s.strip() for s in args.stages.split(',')] if args.stages else None
+
+    print(f"{'size':>12} {'stage':<22} {'best ms':>10} {'median ms':>10} {'peak KB':>12}")
+    results = run(sizes, args.repeat, stages, args.seed)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump([r._asdict() for r in results], f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"❌ regression: {line}")
+        if regressions:
+            return 1
+        print("✅ no regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
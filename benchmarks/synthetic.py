@@ -0,0 +1,88 @@
+"""מחולל קבצי קלט סינתטיים (בקשות ותבנית משמרות) למדידות ביצועים
+
+    python -m benchmarks.synthetic --employees 500 --dates 30 --stations 10 --out-dir data
+"""
+
+import argparse
+import os
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from shibutz import REQUIRED_REQUEST_COLUMNS, REQUIRED_SHIFT_COLUMNS
+
+ATAN_COLUMN = 'אט"ן מורשה'
+DEFAULT_SHIFTS = ('בוקר', 'ערב', 'לילה')
+DEFAULT_START_DATE = '2026-03-01'
+
+def generate_dates(n_dates: int, start: str = DEFAULT_START_DATE,
+                   date_format: str = '%d/%m/%Y') -> List[str]:
+    """תאריכים רצופים בפורמט של קובץ הבקשות"""
+    return list(pd.date_range(start, periods=n_dates).strftime(date_format))
+
+def generate_template(n_stations: int, shifts: Sequence[str] = DEFAULT_SHIFTS,
+                      atan_ratio: float = 0.3, seed: int = 0) -> pd.DataFrame:
+    """תבנית משמרות: כל משמרת בכל תחנה, חלקן תקני אט"ן"""
+    rng = np.random.default_rng(seed)
+    rows = [
+        (f'תחנה {s}', shift, 'אט"ן' if rng.random() < atan_ratio else 'רגיל')
+        for s in range(n_stations) for shift in shifts
+    ]
+    return pd.DataFrame(rows, columns=REQUIRED_SHIFT_COLUMNS)
+
+def generate_requests(n_employees: int, dates: List[str], n_stations: int,
+                      shifts: Sequence[str] = DEFAULT_SHIFTS, requests_per_employee: int = 12,
+                      atan_ratio: float = 0.3, seed: int = 0) -> pd.DataFrame:
+    """בקשות עובדים: כל עובד מבקש משמרות בתאריכים אקראיים (לכל היותר אחת ביום)"""
+    rng = np.random.default_rng(seed)
+    per_employee = min(requests_per_employee, len(dates))
+    n_rows = n_employees * per_employee
+
+    # תאריכים ללא חזרה לכל עובד: מיון מפתחות אקראיים ולקיחת הראשונים
+    date_pos = np.argsort(rng.random((n_employees, len(dates))), axis=1)[:, :per_employee]
+    employee = np.repeat(np.arange(n_employees), per_employee)
+    names = np.array([f'עובד {i}' for i in range(n_employees)], dtype=object)
+    atan = np.where(rng.random(n_employees) < atan_ratio, 'כן', 'לא')
+
+    req_df = pd.DataFrame({
+        'שם': names[employee],
+        'תאריך מבוקש': np.asarray(dates, dtype=object)[date_pos.ravel()],
+        'משמרת': np.asarray(shifts, dtype=object)[rng.integers(len(shifts), size=n_rows)],
+        'תחנה': np.array([f'תחנה {s}' for s in range(n_stations)], dtype=object)[
+            rng.integers(n_stations, size=n_rows)],
+        ATAN_COLUMN: atan[employee]
+    })
+    return req_df[REQUIRED_REQUEST_COLUMNS + [ATAN_COLUMN]]
+
+def generate_inputs(n_employees: int, n_dates: int, n_stations: int,
+                    shifts: Sequence[str] = DEFAULT_SHIFTS, requests_per_employee: int = 12,
+                    atan_ratio: float = 0.3, seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """זוג קבצי קלט תואמים (בקשות, תבנית)"""
+    dates = generate_dates(n_dates)
+    req_df = generate_requests(n_employees, dates, n_stations, shifts,
+                               requests_per_employee, atan_ratio, seed)
+    shi_df = generate_template(n_stations, shifts, atan_ratio, seed)
+    return req_df, shi_df
+
+def main():
+    parser = argparse.ArgumentParser(description="יצירת קבצי קלט סינתטיים")
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--dates", type=int, default=30)
+    parser.add_argument("--stations", type=int, default=8)
+    parser.add_argument("--requests-per-employee", type=int, default=12)
+    parser.add_argument("--atan-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", default=".")
+    args = parser.parse_args()
+
+    req_df, shi_df = generate_inputs(args.employees, args.dates, args.stations,
+                                     requests_per_employee=args.requests_per_employee,
+                                     atan_ratio=args.atan_ratio, seed=args.seed)
+    os.makedirs(args.out_dir, exist_ok=True)
+    req_df.to_csv(os.path.join(args.out_dir, "requests.csv"), index=False, encoding='utf-8-sig')
+    shi_df.to_csv(os.path.join(args.out_dir, "shifts.csv"), index=False, encoding='utf-8-sig')
+    print(f"{len(req_df)} בקשות, {len(shi_df)} שורות תבנית נכתבו ל-{args.out_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -7,16 +7,30 @@
 - ארגון קוד משופר
 - Caching לביצועים
 - לוגים למעקב
+
+הלוגיקה עצמה (קלט, שיבוץ ואחסון) נמצאת בחבילה shibutz; קובץ זה הוא שכבת הממשק.
 """
 
 import streamlit as st
 import pandas as pd
-import firebase_admin
-from firebase_admin import credentials, firestore
-from datetime import datetime
 import logging
+import hashlib
+import math
+import os
+from collections import deque
+from datetime import datetime
 from html import escape
-from typing import Dict, Set, List, Tuple, Optional
+from typing import Dict, List, Optional, Callable
+
+from shibutz import (
+    ENGINE_GREEDY, ENGINE_LABELS, ENGINES, STORAGE_FIRESTORE, STORAGE_SQLITE, DEFAULT_SQLITE_PATH,
+    SlotKey, CandidateIndex, UploadData, ShiftRules, ShiftConstraints,
+    ScheduleStorage, ScheduleDelta, FirestoreStorage, SQLiteStorage,
+    DEFAULT_DRAFTS_PATH, DEFAULT_UNIT, Draft, DraftStore, draft_key, draft_fingerprint,
+    FORMAT_CSV, TABLE_FORMATS, FORMAT_LABELS, FORMAT_MIME, UPLOAD_TYPES,
+    get_day_name, get_shift_rows, load_tables, fill_holes, schedule_metrics, schedule_frame,
+    named_buffer, table_bytes, build_board_html, connect_firestore, span, start_recording
+)
 
 # --- הגדרת לוגים ---
 logging.basicConfig(
@@ -26,18 +40,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # --- קבועים ---
-REQUIRED_REQUEST_COLUMNS = ['שם', 'תאריך מבוקש', 'משמרת', 'תחנה']
-REQUIRED_SHIFT_COLUMNS = ['תחנה', 'משמרת', 'סוג תקן']
-DAYS_HEB = {
-    'Sunday': 'ראשון', 
-    'Monday': 'שני', 
-    'Tuesday': 'שלישי', 
-    'Wednesday': 'רביעי', 
-    'Thursday': 'חמישי', 
-    'Friday': 'שישי', 
-    'Saturday': 'שבת'
-}
-DATE_FORMATS = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d.%m.%Y']
+# מספר העלאות מפוענחות שנשמרות בזיכרון (משותף לכל המשתמשים)
+UPLOAD_CACHE_SIZE = 16
+# מספר ההרצות האחרונות שמוצגות בפאנל הביצועים
+PERF_HISTORY_RUNS = 5
 
 # --- 1. הגדרות דף ועיצוב ---
 st.set_page_config(
@@ -178,172 +184,267 @@ def load_css():
         font-size: 0.9rem;
         opacity: 0.9;
     }
+    
+    /* לוח בתצוגת חלון - טבלת HTML אחת */
+    .board-wrapper {
+        max-height: 70vh;
+        overflow: auto;
+        border: 2px solid #444;
+        border-radius: 4px;
+        margin-bottom: 1rem;
+    }
+    
+    .board-table {
+        direction: rtl;
+        border-collapse: collapse;
+        width: 100%;
+        background-color: #fdfdfd;
+    }
+    
+    .board-table thead th {
+        position: sticky;
+        top: 0;
+        z-index: 1;
+        background-color: #1f77b4;
+        color: white;
+        text-align: center;
+    }
+    
+    .board-table th, .board-table td {
+        border: 1px solid #ccc;
+        padding: 6px 8px;
+        text-align: right;
+        font-size: 0.85rem;
+        min-width: 120px;
+    }
+    
+    .board-table th.board-shift {
+        border-right: 6px solid #ccc;
+        font-weight: bold;
+        color: #222;
+    }
+    
+    .board-table th.type-atan { border-right-color: #FFA500; background-color: #FFF9F0; }
+    .board-table th.type-standard { border-right-color: #2E86C1; background-color: #F0F7FC; }
+    .cell-assigned { background-color: #e8f5e9; color: #1b5e20; }
+    .cell-missing { background-color: #fdecea; color: #b71c1c; }
+    .cell-cancelled { background-color: #f1f1f1; color: #777; }
     </style>
     """, unsafe_allow_html=True)
 
 load_css()
 
 # --- 2. אתחול Firebase ---
-def initialize_firebase() -> firestore.Client:
+def initialize_firebase():
     """אתחול חיבור Firebase עם טיפול בשגיאות"""
-    if not firebase_admin._apps:
-        try:
-            cred = credentials.Certificate(dict(st.secrets["firebase"]))
-            firebase_admin.initialize_app(cred)
-            logger.info("Firebase initialized successfully")
-        except KeyError:
-            st.error("❌ חסרים פרטי התחברות ל-Firebase ב-secrets")
-            logger.error("Firebase secrets not found")
-            st.stop()
-        except Exception as e:
-            st.error(f"❌ שגיאה בחיבור ל-Firebase: {str(e)}")
-            logger.error(f"Firebase initialization failed: {e}")
-            st.stop()
-    
-    return firestore.client()
-
-db = initialize_firebase()
-
-# --- 3. פונקציות עזר ---
-def parse_date_safe(date_str: str) -> datetime:
-    """המרה בטוחה של תאריך עם תמיכה במספר פורמטים"""
-    for fmt in DATE_FORMATS:
-        try:
-            return datetime.strptime(str(date_str).strip(), fmt)
-        except ValueError:
-            continue
-    raise ValueError(f"פורמט תאריך לא תקין: {date_str}")
-
-def get_day_name(date_str: str) -> str:
-    """המרת תאריך לשם יום בעברית"""
     try:
-        dt = parse_date_safe(date_str)
-        return DAYS_HEB.get(dt.strftime('%A'), "")
-    except ValueError:
-        logger.warning(f"Invalid date format: {date_str}")
-        return ""
+        return connect_firestore(dict(st.secrets["firebase"]))
+    except KeyError:
+        st.error("❌ חסרים פרטי התחברות ל-Firebase ב-secrets")
+        logger.error("Firebase secrets not found")
+        st.stop()
+    except Exception as e:
+        st.error(f"❌ שגיאה בחיבור ל-Firebase: {str(e)}")
+        logger.error(f"Firebase initialization failed: {e}")
+        st.stop()
 
-def validate_dataframes(req_df: pd.DataFrame, shi_df: pd.DataFrame) -> List[str]:
-    """ולידציה של DataFrame - בדיקת עמודות נדרשות"""
-    errors = []
-    
-    missing_req = set(REQUIRED_REQUEST_COLUMNS) - set(req_df.columns)
-    missing_shi = set(REQUIRED_SHIFT_COLUMNS) - set(shi_df.columns)
-    
-    if missing_req:
-        errors.append(f"❌ עמודות חסרות בקובץ בקשות: {', '.join(missing_req)}")
-    if missing_shi:
-        errors.append(f"❌ עמודות חסרות בתבנית משמרות: {', '.join(missing_shi)}")
-    
-    # בדיקת תאריכים
-    try:
-        for date_str in req_df['תאריך מבוקש'].unique():
-            parse_date_safe(date_str)
-    except ValueError as e:
-        errors.append(f"❌ {str(e)}")
-    
-    return errors
-
-def get_atan_column(df: pd.DataFrame) -> Optional[str]:
-    """חיפוש בטוח של עמודת אישור אט"ן"""
-    atan_cols = [c for c in df.columns if "אט" in c and "מורשה" in c]
-    if not atan_cols:
-        logger.warning("Atan column not found")
-        return None
-    return atan_cols[0]
+# --- 3. פונקציות עזר ---
+def get_upload_digest(uploaded_file) -> str:
+    """טביעת אצבע של תוכן הקובץ (מחושבת פעם אחת לכל העלאה)"""
+    digests = st.session_state.setdefault('upload_digests', {})
+    digest = digests.get(uploaded_file.file_id)
+    if digest is None:
+        digest = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+        digests[uploaded_file.file_id] = digest
+    return digest
+
+@st.cache_resource(max_entries=UPLOAD_CACHE_SIZE, show_spinner="טוען קבצים...")
+def load_uploads(req_digest: str, shi_digest: str, _req_file, _shi_file) -> UploadData:
+    """קריאה, פענוח ואינדוקס של קבצי הקלט - פעם אחת לכל תוכן קובץ"""
+    logger.info(f"Parsing upload {req_digest[:8]}/{shi_digest[:8]}")
+    # השם נשמר כדי שהפורמט יזוהה לפי הסיומת
+    return load_tables(named_buffer(_req_file.getvalue(), _req_file.name),
+                       named_buffer(_shi_file.getvalue(), _shi_file.name))
 
-@st.cache_data(ttl=60)
 def get_balance() -> Dict[str, int]:
-    """טעינת מאזן משמרות לכל עובד מ-Firebase"""
-    scores = {}
+    """טעינת מאזן משמרות לכל עובד ממנוע האחסון"""
     try:
-        for doc in db.collection('employee_history').stream():
-            scores[doc.id] = doc.to_dict().get('total_shifts', 0)
-        logger.info(f"Loaded balance for {len(scores)} employees")
+        return get_storage().load_balance()
     except Exception as e:
         st.warning(f"⚠️ לא ניתן לטעון מאזן עובדים מה-Database: {str(e)}")
         logger.error(f"Failed to load balance: {e}")
-    return scores
+        return {}
 
-def save_to_firebase(schedule: Dict[str, str]) -> bool:
-    """שמירת השיבוצים ל-Firebase"""
+def get_storage_config() -> Dict[str, str]:
+    """הגדרות האחסון מ-[storage] ב-secrets, עם אפשרות דריסה במשתני סביבה"""
     try:
-        # יצירת batch לשמירה יעילה
-        batch = db.batch()
-        timestamp = firestore.SERVER_TIMESTAMP
-        
-        # שמירת כל השיבוצים
-        for shift_key, employee in schedule.items():
-            parts = shift_key.split('_')
-            date_str = parts[0]
-            station = parts[1]
-            shift_type = parts[2]
-            
-            doc_ref = db.collection('assignments').document(shift_key)
-            batch.set(doc_ref, {
-                'employee': employee,
-                'date': date_str,
-                'station': station,
-                'shift': shift_type,
-                'timestamp': timestamp
-            })
-        
-        # עדכון מאזן עובדים
-        employee_counts = {}
-        for employee in schedule.values():
-            employee_counts[employee] = employee_counts.get(employee, 0) + 1
-        
-        for employee, count in employee_counts.items():
-            emp_ref = db.collection('employee_history').document(employee)
-            batch.set(emp_ref, {
-                'total_shifts': firestore.Increment(count),
-                'last_updated': timestamp
-            }, merge=True)
-        
-        # ביצוע השמירה
-        batch.commit()
-        logger.info(f"Saved {len(schedule)} assignments to Firebase")
-        return True
-        
+        config = dict(st.secrets.get("storage", {}))
+    except FileNotFoundError:
+        config = {}
+    if os.environ.get("SHIBUTZ_STORAGE"):
+        config['backend'] = os.environ["SHIBUTZ_STORAGE"]
+    if os.environ.get("SHIBUTZ_SQLITE_PATH"):
+        config['path'] = os.environ["SHIBUTZ_SQLITE_PATH"]
+    if os.environ.get("SHIBUTZ_UNIT"):
+        config['unit'] = os.environ["SHIBUTZ_UNIT"]
+    if os.environ.get("SHIBUTZ_DRAFTS_PATH"):
+        config['drafts_path'] = os.environ["SHIBUTZ_DRAFTS_PATH"]
+    return config
+
+@st.cache_resource
+def get_storage() -> ScheduleStorage:
+    """מנוע האחסון הפעיל - אחד לכל תהליך השרת"""
+    config = get_storage_config()
+    backend = config.get('backend', STORAGE_FIRESTORE)
+    if backend == STORAGE_SQLITE:
+        storage = SQLiteStorage(config.get('path', DEFAULT_SQLITE_PATH))
+    elif backend == STORAGE_FIRESTORE:
+        storage = FirestoreStorage(initialize_firebase())
+    else:
+        st.error(f"❌ מנוע אחסון לא מוכר: {backend}")
+        st.stop()
+    logger.info(f"Storage backend: {storage.name}")
+    return storage
+
+def get_committed(dates: List[str], shi_df: pd.DataFrame) -> Dict[str, str]:
+    """השיבוץ השמור של הלוח הנוכחי (מזהה מסמך -> עובד), כפי שהוא באחסון עכשיו.
+    
+    נקרא מחדש לפני כל שמירה (שאילתה לכל 30 תאריכים), כך שההבדל מחושב גם מול
+    שמירות של רכזים אחרים. רק משמרות של התבנית הנוכחית בתאריכי הלוח נחשבות -
+    שיבוצים אחרים באותם תאריכים לא יימחקו.
+    """
+    board = {
+        SlotKey(date_str, station, shift, idx).to_id()
+        for date_str in dates for idx, station, shift, _ in get_shift_rows(shi_df)
+    }
+    return {
+        slot_id: employee for slot_id, employee in get_storage().load_assignments(dates).items()
+        if slot_id in board
+    }
+
+def save_schedule(schedule: Dict[SlotKey, str], dates: List[str], shi_df: pd.DataFrame,
+                  on_progress: Optional[Callable[[int, int], None]] = None) -> Optional[ScheduleDelta]:
+    """שמירת ההבדל בין הלוח לשיבוץ השמור במנוע האחסון הפעיל"""
+    try:
+        return get_storage().save_changes(schedule, get_committed(dates, shi_df), on_progress)
     except Exception as e:
         st.error(f"❌ שגיאה בשמירת הנתונים: {str(e)}")
-        logger.error(f"Firebase save failed: {e}")
-        return False
+        logger.error(f"Schedule save failed: {e}")
+        return None
+
+# --- טיוטות ---
+@st.cache_resource
+def get_draft_store() -> DraftStore:
+    """מאגר הטיוטות המקומי - אחד לכל תהליך השרת, גם כשהאחסון הראשי הוא Firestore"""
+    return DraftStore(get_storage_config().get('drafts_path', DEFAULT_DRAFTS_PATH))
+
+def board_fingerprint() -> int:
+    return draft_fingerprint(
+        st.session_state.final_schedule, st.session_state.cancelled_shifts,
+        st.session_state.manual_slots, st.session_state.dirty_dates
+    )
+
+def track_draft(req_digest: str, shi_digest: str) -> str:
+    """מפתח הטיוטה של ההעלאה הנוכחית; בהעלאה חדשה המצב הקיים נחשב שמור"""
+    key = draft_key(get_storage_config().get('unit', DEFAULT_UNIT), req_digest, shi_digest)
+    if st.session_state.get('draft_key') != key:
+        st.session_state.draft_key = key
+        st.session_state.draft_fingerprint = board_fingerprint()
+    return key
+
+def autosave_draft():
+    """שמירת הטיוטה בסוף ההרצה - רק אם המצב השתנה מאז השמירה הקודמת.
+    
+    כל השינויים של הרצה אחת (ושל ההרצות שנקטעו ב-st.rerun לפניה) נכתבים
+    בכתיבה אחת; לוח ריק (למשל אחרי איפוס) מוחק את הטיוטה.
+    """
+    key = st.session_state.get('draft_key')
+    fingerprint = board_fingerprint()
+    if key is None or fingerprint == st.session_state.get('draft_fingerprint'):
+        return
+    try:
+        if st.session_state.final_schedule or st.session_state.cancelled_shifts:
+            get_draft_store().save(key, Draft(
+                st.session_state.final_schedule, st.session_state.cancelled_shifts,
+                st.session_state.manual_slots, st.session_state.dirty_dates
+            ))
+        else:
+            get_draft_store().delete(key)
+        st.session_state.draft_fingerprint = fingerprint
+    except Exception as e:
+        st.warning(f"⚠️ לא ניתן לשמור טיוטה: {str(e)}")
+        logger.error(f"Draft save failed: {e}")
+
+def restore_draft(draft: Draft):
+    """החזרת הלוח מטיוטה - בלי שיבוץ מחדש; מעקב האילוצים נבנה מהשיבוץ בהרצה הבאה"""
+    st.session_state.final_schedule = draft.schedule
+    st.session_state.cancelled_shifts = draft.cancelled
+    st.session_state.manual_slots = draft.manual_slots
+    st.session_state.dirty_dates = draft.dirty_dates
+    assigned_today = {}
+    for shift_key, name in draft.schedule.items():
+        assigned_today.setdefault(shift_key.date, set()).add(name)
+    st.session_state.assigned_today = assigned_today
+    st.session_state.pop('constraints_key', None)
+    st.session_state.draft_fingerprint = board_fingerprint()
+    logger.info(f"Draft restored: {len(draft.schedule)} assignments from {draft.saved_at}")
+
+def offer_draft(key: str):
+    """הצעה להמשיך טיוטה שמורה כשהלוח ריק (למשל אחרי רענון הדפדפן)"""
+    try:
+        info = get_draft_store().info(key)
+    except Exception as e:
+        logger.error(f"Draft lookup failed: {e}")
+        return
+    if info is None:
+        return
+    st.info(f"📝 נמצאה טיוטה שמורה לקבצים אלה: {info.assigned} שיבוצים (נשמרה {info.saved_at})")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("♻️ המשך טיוטה", type="primary", use_container_width=True):
+            draft = get_draft_store().load(key)
+            if draft is not None:
+                restore_draft(draft)
+            st.rerun()
+    with col2:
+        if st.button("🗑️ מחק טיוטה", use_container_width=True):
+            get_draft_store().delete(key)
+            logger.info(f"Draft discarded: {key}")
+            st.rerun()
 
 # --- 4. דיאלוג שיבוץ ידני ---
 @st.dialog("שיבוץ עובד", width="large")
-def show_manual_picker(shift_key: str, date_str: str, s_row: pd.Series, 
-                       req_df: pd.DataFrame, balance: Dict[str, int]):
+def show_manual_picker(shift_key: SlotKey, date_str: str, s_row: pd.Series, 
+                       index: CandidateIndex, balance: Dict[str, int]):
     """דיאלוג לבחירת עובד ידנית למשמרת"""
     st.markdown(f"### שיבוץ ליום {get_day_name(date_str)} ({date_str})")
     st.write(f"**תחנה:** {s_row['תחנה']} | **משמרת:** {s_row['משמרת']}")
     
-    # סינון מועמדים זמינים
-    avail = req_df[req_df['תאריך מבוקש'] == date_str].copy()
-    already_working = st.session_state.assigned_today.get(date_str, set())
-    avail = avail[~avail['שם'].isin(already_working)]
-    
     # סינון לפי אט"ן אם נדרש
-    if "אט" in str(s_row['סוג תקן']):
-        atan_col = get_atan_column(req_df)
-        if atan_col:
-            avail = avail[avail[atan_col] == 'כן']
-        else:
-            st.warning("⚠️ לא נמצאה עמודת אישור אט\"ן")
+    atan_only = "אט" in str(s_row['סוג תקן'])
+    if atan_only and not index.has_atan:
+        st.warning("⚠️ לא נמצאה עמודת אישור אט\"ן")
+    
+    # מועמדים זמינים מהאינדקס - ללא העתקת טבלת הבקשות; כללי המנוחה נבדקים בחיפוש בינארי
+    constraints: ShiftConstraints = st.session_state.constraints
+    requested = index.date_candidates(date_str, atan_only=atan_only)
+    avail = [name for name in requested if constraints.can_assign(name, date_str, shift_key.row)]
+    if len(avail) < len(requested):
+        st.caption(f"🚫 {len(requested) - len(avail)} עובדים לא מוצגים: כבר משובצים, "
+                   f"בלי מנוחה מספקת או מעבר למכסה")
     
-    if avail.empty:
+    if not avail:
         st.warning("😕 אין מועמדים פנויים למשמרת זו")
         if st.button("סגור", use_container_width=True):
             st.rerun()
     else:
         # מיון לפי מאזן (מי שעבד הכי פחות יהיה ראשון)
-        avail['bal'] = avail['שם'].map(lambda x: balance.get(x, 0))
-        avail = avail.sort_values('bal')
+        avail.sort(key=lambda x: balance.get(x, 0))
         
         # יצירת אפשרויות בחירה
         options = {
-            f"👤 {r['שם']} (מאזן: {int(r['bal'])} משמרות)": r['שם'] 
-            for _, r in avail.iterrows()
+            f"👤 {name} (מאזן: {int(balance.get(name, 0))} משמרות)": name
+            for name in avail
         }
         
         choice = st.radio(
@@ -360,13 +461,172 @@ def show_manual_picker(shift_key: str, date_str: str, s_row: pd.Series,
                     name = options[choice]
                     st.session_state.final_schedule[shift_key] = name
                     st.session_state.assigned_today.setdefault(date_str, set()).add(name)
-                    logger.info(f"Manually assigned {name} to {shift_key}")
+                    constraints.add(name, date_str, shift_key.row)
+                    st.session_state.manual_slots.add(shift_key)
+                    logger.info(f"Manually assigned {name} to {shift_key.to_id()}")
                     st.rerun()
         
         with col2:
             if st.button("❌ ביטול", use_container_width=True):
                 st.rerun()
 
+# --- תצוגת הלוח ---
+BOARD_MODE_AUTO = "auto"
+BOARD_MODE_FULL = "full"
+BOARD_MODE_WINDOW = "window"
+BOARD_MODE_LABELS = {
+    BOARD_MODE_AUTO: "🔄 אוטומטי",
+    BOARD_MODE_FULL: "📋 לוח מלא",
+    BOARD_MODE_WINDOW: "🔍 חלון (שבוע / תחנות)"
+}
+# מעל מספר תאים זה מצב אוטומטי עובר לתצוגת חלון
+BOARD_FULL_MAX_CELLS = 300
+WINDOW_DAYS = 7
+WINDOW_SHIFT_ROWS = 20
+
+def unassign(shift_key: SlotKey, employee: str):
+    """הסרת שיבוץ מהלוח וממעקב האילוצים; התאריך מסומן להשלמת חורים"""
+    st.session_state.assigned_today.get(shift_key.date, set()).discard(employee)
+    st.session_state.constraints.remove(employee, shift_key.date, shift_key.row)
+    st.session_state.manual_slots.discard(shift_key)
+    st.session_state.dirty_dates.add(shift_key.date)
+    del st.session_state.final_schedule[shift_key]
+
+def render_cell_actions(shift_key: SlotKey, date_str: str, shift_row: pd.Series,
+                        index: CandidateIndex, balance: Dict[str, int]):
+    """סטטוס וכפתורי פעולה של משמרת אחת"""
+    assigned = st.session_state.final_schedule.get(shift_key)
+    cancelled = shift_key in st.session_state.cancelled_shifts
+    
+    if cancelled:
+        st.caption("🚫 משמרת מבוטלת")
+        if st.button("🔄 שחזר", key=f"restore_{shift_key.to_id()}", use_container_width=True):
+            st.session_state.cancelled_shifts.remove(shift_key)
+            st.session_state.dirty_dates.add(shift_key.date)
+            logger.info(f"Shift restored: {shift_key.to_id()}")
+            st.rerun()
+    
+    elif assigned:
+        pin = " 📌" if shift_key in st.session_state.manual_slots else ""
+        st.success(f"👤 {assigned}{pin}")
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            if st.button("🗑️ הסר", key=f"remove_{shift_key.to_id()}", use_container_width=True):
+                unassign(shift_key, assigned)
+                logger.info(f"Assignment removed: {shift_key.to_id()}")
+                st.rerun()
+        with col2:
+            if st.button("✏️", key=f"edit_{shift_key.to_id()}", use_container_width=True):
+                unassign(shift_key, assigned)
+                show_manual_picker(shift_key, date_str, shift_row, index, balance)
+    
+    else:
+        st.error("⚠️ חסר שיבוץ")
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            if st.button("➕ שבץ", key=f"assign_{shift_key.to_id()}", use_container_width=True):
+                show_manual_picker(shift_key, date_str, shift_row, index, balance)
+        with col2:
+            if st.button("🚫", key=f"cancel_{shift_key.to_id()}", use_container_width=True):
+                st.session_state.cancelled_shifts.add(shift_key)
+                logger.info(f"Shift cancelled: {shift_key.to_id()}")
+                st.rerun()
+
+def render_board_window(dates: List[str], day_names: Dict[str, str], shi_df: pd.DataFrame,
+                        index: CandidateIndex, balance: Dict[str, int]):
+    """תצוגת חלון: שבוע אחד ועמוד משמרות אחד, כפתורים רק למשמרת הנבחרת"""
+    weeks = [dates[i:i + WINDOW_DAYS] for i in range(0, len(dates), WINDOW_DAYS)]
+    
+    col1, col2, col3 = st.columns([2, 3, 1])
+    with col1:
+        week_no = st.selectbox(
+            "שבוע", range(len(weeks)),
+            format_func=lambda i: f"{weeks[i][0]} – {weeks[i][-1]}",
+            key='board_week'
+        )
+    with col2:
+        stations = st.multiselect(
+            "סינון תחנות", shi_df['תחנה'].drop_duplicates().tolist(), key='board_stations'
+        )
+    view = shi_df[shi_df['תחנה'].isin(stations)] if stations else shi_df
+    pages = max(1, math.ceil(len(view) / WINDOW_SHIFT_ROWS))
+    with col3:
+        page = st.selectbox("עמוד", range(pages), format_func=lambda p: f"{p + 1}/{pages}", key='board_page')
+    
+    week_dates = weeks[week_no or 0]
+    view = view.iloc[(page or 0) * WINDOW_SHIFT_ROWS:((page or 0) + 1) * WINDOW_SHIFT_ROWS]
+    
+    st.markdown(
+        build_board_html(week_dates, day_names, view,
+                         st.session_state.final_schedule, st.session_state.cancelled_shifts),
+        unsafe_allow_html=True
+    )
+    
+    if view.empty:
+        return
+    
+    # פעולות רק עבור המשמרת הנבחרת
+    st.markdown("#### ✏️ עריכת משמרת")
+    col1, col2 = st.columns(2)
+    with col1:
+        date_str = st.selectbox(
+            "תאריך", week_dates,
+            format_func=lambda d: f"{day_names.get(d, '')} {d}",
+            key='board_cell_date'
+        )
+    with col2:
+        idx = st.selectbox(
+            "משמרת", view.index.tolist(),
+            format_func=lambda i: f"{shi_df.at[i, 'תחנה']} | {shi_df.at[i, 'משמרת']} | {shi_df.at[i, 'סוג תקן']}",
+            key='board_cell_row'
+        )
+    if date_str is None or idx is None:
+        return
+    
+    shift_row = shi_df.loc[idx]
+    shift_key = SlotKey.from_row(date_str, shift_row, idx)
+    render_cell_actions(shift_key, date_str, shift_row, index, balance)
+
+# --- מדדי ביצועים ---
+def render_perf_panel():
+    """פירוט זמנים לפי מקטע בהרצות האחרונות של הדף"""
+    rows = [
+        {
+            'הרצה': run_no,
+            'מקטע': record['span'],
+            'ms': record['ms'],
+            'פרטים': ', '.join(f"{k}={v}" for k, v in record.items() if k not in ('span', 'ms'))
+        }
+        for run_no, spans in reversed(st.session_state.perf_runs)
+        for record in spans
+    ]
+    if not rows:
+        st.caption("אין מדידות בהרצות האחרונות (שלבים שהוגשו מה-cache אינם נמדדים)")
+        return
+    st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
+# --- כללי שיבוץ ---
+def get_rules() -> ShiftRules:
+    """הכללים שנבחרו בסרגל הצד"""
+    return ShiftRules(
+        int(st.session_state.get('max_per_day', 1)),
+        float(st.session_state.get('min_rest_hours', 0.0)),
+        int(st.session_state.get('max_shifts_per_week', 0)),
+        float(st.session_state.get('max_hours_per_week', 0.0)),
+        int(st.session_state.get('max_shifts_per_month', 0)),
+        float(st.session_state.get('max_hours_per_month', 0.0))
+    )
+
+def get_constraints(shi_df: pd.DataFrame, template_id: str, rules: ShiftRules) -> ShiftConstraints:
+    """מעקב האילוצים של השיבוץ הנוכחי - נבנה מחדש רק אם התבנית או הכללים השתנו"""
+    key = (template_id, rules)
+    if st.session_state.get('constraints_key') != key:
+        st.session_state.constraints = ShiftConstraints.from_schedule(
+            shi_df, st.session_state.final_schedule, rules
+        )
+        st.session_state.constraints_key = key
+    return st.session_state.constraints
+
 # --- 5. אתחול Session State ---
 def init_session_state():
     """אתחול משתני מצב"""
@@ -380,71 +640,36 @@ def init_session_state():
         st.session_state.trigger_auto = False
     if 'trigger_save' not in st.session_state:
         st.session_state.trigger_save = False
+    if 'manual_slots' not in st.session_state:
+        # שיבוצים ידניים - נעולים בהשלמת חורים
+        st.session_state.manual_slots = set()
+    if 'dirty_dates' not in st.session_state:
+        # תאריכים שבהם נפתחו חורים מאז השיבוץ האחרון
+        st.session_state.dirty_dates = set()
+    if 'perf_runs' not in st.session_state:
+        st.session_state.perf_runs = deque(maxlen=PERF_HISTORY_RUNS)
+        st.session_state.perf_run_no = 0
 
 init_session_state()
 
-# --- 6. אלגוריתם שיבוץ אוטומטי ---
-def auto_assign(dates: List[str], shi_df: pd.DataFrame, 
-                req_df: pd.DataFrame, balance: Dict[str, int]) -> Tuple[Dict, Dict]:
-    """שיבוץ אוטומטי של כל המשמרות"""
-    temp_schedule = {}
-    temp_assigned_today = {d: set() for d in dates}
-    running_balance = balance.copy()
-    
-    atan_col = get_atan_column(req_df)
-    
-    assigned_count = 0
-    missing_count = 0
-    
-    for date_str in dates:
-        for idx, shift_row in shi_df.iterrows():
-            shift_key = f"{date_str}_{shift_row['תחנה']}_{shift_row['משמרת']}_{idx}"
-            
-            # דלג על משמרות מבוטלות
-            if shift_key in st.session_state.cancelled_shifts:
-                continue
-            
-            # מצא מועמדים פוטנציאליים
-            potential = req_df[
-                (req_df['תאריך מבוקש'] == date_str) & 
-                (req_df['משמרת'] == shift_row['משמרת']) & 
-                (req_df['תחנה'] == shift_row['תחנה']) & 
-                (~req_df['שם'].isin(temp_assigned_today[date_str]))
-            ].copy()
-            
-            # סינון לפי אט"ן אם נדרש
-            if "אט" in str(shift_row['סוג תקן']) and atan_col:
-                potential = potential[potential[atan_col] == 'כן']
-            
-            if not potential.empty:
-                # מיון לפי מאזן ובחירת המתאים ביותר
-                potential['score'] = potential['שם'].map(lambda x: running_balance.get(x, 0))
-                best_employee = potential.sort_values('score').iloc[0]['שם']
-                
-                temp_schedule[shift_key] = best_employee
-                temp_assigned_today[date_str].add(best_employee)
-                running_balance[best_employee] = running_balance.get(best_employee, 0) + 1
-                assigned_count += 1
-            else:
-                missing_count += 1
-    
-    logger.info(f"Auto-assignment: {assigned_count} assigned, {missing_count} missing")
-    return temp_schedule, temp_assigned_today
+# איסוף מדידות הזמנים של ההרצה הנוכחית (נשמרות גם כשההרצה נקטעת ב-st.rerun)
+st.session_state.perf_run_no += 1
+st.session_state.perf_runs.append((st.session_state.perf_run_no, start_recording()))
 
-# --- 7. Sidebar ---
+# --- 6. Sidebar ---
 with st.sidebar:
     st.title("⚙️ ניהול המערכת")
     
     st.markdown("### 📁 העלאת קבצים")
     req_file = st.file_uploader(
         "קובץ בקשות עובדים", 
-        type=['csv'],
-        help="CSV עם עמודות: שם, תאריך מבוקש, משמרת, תחנה"
+        type=UPLOAD_TYPES,
+        help="CSV, Excel, Parquet או Arrow עם עמודות: שם, תאריך מבוקש, משמרת, תחנה"
     )
     shi_file = st.file_uploader(
         "תבנית משמרות", 
-        type=['csv'],
-        help="CSV עם עמודות: תחנה, משמרת, סוג תקן"
+        type=UPLOAD_TYPES,
+        help="CSV, Excel, Parquet או Arrow עם עמודות: תחנה, משמרת, סוג תקן"
     )
     
     st.divider()
@@ -457,20 +682,79 @@ with st.sidebar:
                     st.session_state[key] = set()
                 else:
                     st.session_state[key] = {}
+        st.session_state.manual_slots = set()
+        st.session_state.dirty_dates = set()
+        st.session_state.pop('constraints_key', None)
+        # הטיוטה נמחקת כבר כאן - אחרת היא מוצעת לשחזור מיד בהרצה הבאה
+        key = st.session_state.get('draft_key')
+        if key is not None:
+            try:
+                get_draft_store().delete(key)
+            except Exception as e:
+                logger.error(f"Draft delete failed: {e}")
+            st.session_state.draft_fingerprint = board_fingerprint()
         logger.info("Schedule cleared")
         st.rerun()
     
     if req_file and shi_file:
+        st.radio(
+            "מנוע שיבוץ",
+            list(ENGINE_LABELS.keys()),
+            format_func=ENGINE_LABELS.get,
+            key='engine',
+            help="המנוע האופטימלי פותר כל יום כהשמה גלובלית וממלא יותר משמרות"
+        )
+        st.radio(
+            "תצוגת לוח",
+            list(BOARD_MODE_LABELS.keys()),
+            format_func=BOARD_MODE_LABELS.get,
+            key='board_mode',
+            help="בלוח גדול תצוגת חלון מציגה שבוע אחד ומהירה בהרבה"
+        )
+        with st.expander("⏱️ כללי מנוחה ומכסות"):
+            st.number_input(
+                "מקסימום משמרות לעובד ביום", min_value=1, max_value=3, value=1,
+                key='max_per_day',
+                help="יותר ממשמרת אחת ביום רק למשמרות שאינן חופפות (לפי שעות התבנית). "
+                     "המנוע האופטימלי משבץ כל משמרת נוספת ביום בסבב השמה נפרד"
+            )
+            st.number_input(
+                "מנוחה מינימלית בין משמרות (שעות)", min_value=0.0, max_value=24.0,
+                value=0.0, step=0.5, key='min_rest_hours',
+                help="נבדק רק כשבתבנית יש עמודות 'שעת התחלה' ו-'שעת סיום'"
+            )
+            st.caption("מכסות לעובד (0 - ללא הגבלה; שבוע מתחיל ביום ראשון)")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.number_input("משמרות בשבוע", min_value=0, value=0, key='max_shifts_per_week')
+                st.number_input("משמרות בחודש", min_value=0, value=0, key='max_shifts_per_month')
+            with col2:
+                st.number_input("שעות בשבוע", min_value=0.0, value=0.0, step=1.0,
+                                key='max_hours_per_week', help="דורש שעות בתבנית")
+                st.number_input("שעות בחודש", min_value=0.0, value=0.0, step=1.0,
+                                key='max_hours_per_month', help="דורש שעות בתבנית")
         if st.button("🪄 שיבוץ אוטומטי", type="primary", use_container_width=True):
             st.session_state.trigger_auto = True
             st.rerun()
+        if st.session_state.final_schedule:
+            dirty_count = len(st.session_state.dirty_dates)
+            if st.button(
+                f"🩹 השלמת חורים (ימים שנערכו: {dirty_count})" if dirty_count else "🩹 השלמת חורים",
+                use_container_width=True,
+                help="משבץ רק משמרות ריקות, בימים שנערכו (או בכל הלוח אם לא נערך דבר). "
+                     "שיבוצים קיימים וידניים לא משתנים"
+            ):
+                st.session_state.trigger_repair = True
+                st.rerun()
     
     if st.session_state.final_schedule:
         if st.button("💾 שמירה ל-Database", type="primary", use_container_width=True):
             st.session_state.trigger_save = True
             st.rerun()
         
-        if st.button("📥 ייצוא לאקסל", use_container_width=True):
+        st.selectbox("פורמט ייצוא", TABLE_FORMATS, format_func=FORMAT_LABELS.get,
+                     key='export_format')
+        if st.button("📥 ייצוא", use_container_width=True):
             st.session_state.trigger_export = True
     
     st.divider()
@@ -505,165 +789,185 @@ with st.sidebar:
             """, unsafe_allow_html=True)
     
     st.divider()
+    st.toggle("⏱️ מדדי ביצועים", key='show_perf', help="פירוט זמנים לכל שלב בהרצות האחרונות")
     st.caption("מערכת שיבוץ מבצעית 2026 v2.0")
 
-# --- 8. גוף האפליקציה ---
+# --- 7. גוף האפליקציה ---
 st.title("📅 מערכת שיבוץ מבצעית")
 
-# טיפול בשמירה
-if st.session_state.get('trigger_save'):
-    with st.spinner('שומר נתונים ל-Database...'):
-        if save_to_firebase(st.session_state.final_schedule):
-            st.success("✅ השיבוץ נשמר בהצלחה ל-Database!")
-            # ניקוי cache של המאזן
-            get_balance.clear()
-        st.session_state.trigger_save = False
-
 # טיפול בייצוא
 if st.session_state.get('trigger_export'):
     if st.session_state.final_schedule:
-        export_data = []
-        for shift_key, employee in st.session_state.final_schedule.items():
-            parts = shift_key.split('_')
-            export_data.append({
-                'תאריך': parts[0],
-                'תחנה': parts[1],
-                'משמרת': parts[2],
-                'עובד': employee
-            })
-        export_df = pd.DataFrame(export_data)
-        csv = export_df.to_csv(index=False, encoding='utf-8-sig')
+        export_format = st.session_state.get('export_format', FORMAT_CSV)
+        export_df = schedule_frame(st.session_state.final_schedule)
         st.download_button(
-            label="📥 הורד קובץ CSV",
-            data=csv,
-            file_name=f"shibutz_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
+            label=f"📥 הורד קובץ {FORMAT_LABELS[export_format]}",
+            data=table_bytes(export_df, export_format),
+            file_name=f"shibutz_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}",
+            mime=FORMAT_MIME[export_format]
         )
     st.session_state.trigger_export = False
 
 # טעינה ועיבוד קבצים
 if req_file and shi_file:
     try:
-        # טעינת קבצים
-        req_df = pd.read_csv(req_file, encoding='utf-8-sig')
-        shi_df = pd.read_csv(shi_file, encoding='utf-8-sig')
+        # טעינת קבצים (מה-cache אם התוכן כבר פוענח)
+        upload = load_uploads(
+            get_upload_digest(req_file), get_upload_digest(shi_file),
+            req_file, shi_file
+        )
         
         # ולידציה
-        validation_errors = validate_dataframes(req_df, shi_df)
-        if validation_errors:
+        if upload.errors:
             st.error("### שגיאות בקבצים:")
-            for error in validation_errors:
+            for error in upload.errors:
                 st.error(error)
             st.stop()
         
-        # מיון תאריכים
-        dates = sorted(
-            req_df['תאריך מבוקש'].unique(), 
-            key=parse_date_safe
-        )
+        req_df, shi_df = upload.req_df, upload.shi_df
+        dates, day_names = upload.dates, upload.day_names
+        
+        # טיוטה שמורה - מוצעת כל עוד הלוח ריק
+        current_draft = track_draft(get_upload_digest(req_file), get_upload_digest(shi_file))
+        if not st.session_state.final_schedule and not st.session_state.cancelled_shifts:
+            offer_draft(current_draft)
         
         # טעינת מאזן עובדים
         global_balance = get_balance()
+        rules = get_rules()
+        template_id = get_upload_digest(shi_file)
+        get_constraints(shi_df, template_id, rules)
+        
+        # טיפול בשמירה - רק השינויים מאז השמירה הקודמת
+        if st.session_state.get('trigger_save'):
+            with st.spinner('שומר נתונים ל-Database...'):
+                progress = st.progress(0.0, text="שומר...")
+                delta = save_schedule(
+                    st.session_state.final_schedule, dates, shi_df,
+                    on_progress=lambda done, total: progress.progress(
+                        done / total, text=f"נשמרו {done}/{total} חבילות"
+                    )
+                )
+                if delta is not None and delta.empty:
+                    st.info("ℹ️ אין שינויים לשמירה - השיבוץ כבר שמור ב-Database")
+                elif delta is not None:
+                    st.success(f"✅ השיבוץ נשמר ל-Database: {len(delta.upserts)} שיבוצים נכתבו, "
+                               f"{len(delta.removed)} הוסרו")
+                # משיכת המאזן המעודכן בטעינה הבאה (גם אחרי שמירה חלקית)
+                get_storage().invalidate()
+                st.session_state.trigger_save = False
+                global_balance = get_balance()
         
         # שיבוץ אוטומטי
         if st.session_state.get('trigger_auto'):
             with st.spinner('מבצע שיבוץ אוטומטי...'):
-                temp_schedule, temp_assigned = auto_assign(
-                    dates, shi_df, req_df, global_balance
+                engine = ENGINES[st.session_state.get('engine', ENGINE_GREEDY)]
+                constraints = ShiftConstraints(shi_df, rules)
+                temp_schedule, temp_assigned = engine(
+                    dates, shi_df, req_df, global_balance,
+                    index=upload.index,
+                    cancelled=st.session_state.cancelled_shifts,
+                    constraints=constraints
                 )
                 st.session_state.final_schedule = temp_schedule
                 st.session_state.assigned_today = temp_assigned
+                st.session_state.constraints = constraints
+                st.session_state.constraints_key = (template_id, rules)
+                st.session_state.manual_slots = set()
+                st.session_state.dirty_dates = set()
                 st.session_state.trigger_auto = False
                 logger.info("Auto-assignment completed")
             st.success("✅ שיבוץ אוטומטי הושלם!")
             st.rerun()
         
+        # השלמת חורים - רק משמרות ריקות בימים שנערכו, בלי לגעת בשיבוצים הקיימים
+        if st.session_state.get('trigger_repair'):
+            repair_dates = [d for d in dates if d in st.session_state.dirty_dates] or dates
+            # המאזן השמור כבר כולל את מה שנשמר - רק שינויים שלא נשמרו נוספים אליו
+            try:
+                committed = get_committed(dates, shi_df)
+            except Exception as e:
+                # ההשלמה ממשיכה כמו קודם: כל הלוח נחשב לא שמור
+                logger.error(f"Committed snapshot load failed, treating the board as unsaved: {e}")
+                committed = {}
+            added = fill_holes(
+                repair_dates, shi_df, req_df, global_balance,
+                st.session_state.final_schedule,
+                index=upload.index,
+                cancelled=st.session_state.cancelled_shifts,
+                constraints=st.session_state.constraints,
+                committed=committed
+            )
+            st.session_state.final_schedule.update(added)
+            for shift_key, name in added.items():
+                st.session_state.assigned_today.setdefault(shift_key.date, set()).add(name)
+            st.session_state.dirty_dates = set()
+            st.session_state.trigger_repair = False
+            logger.info(f"Filled {len(added)} holes on {len(repair_dates)} dates")
+            st.rerun()
+        
         # הצגת לוח השיבוצים
         st.markdown("---")
-        cols = st.columns(len(dates))
+        board_mode = st.session_state.get('board_mode', BOARD_MODE_AUTO)
+        if board_mode == BOARD_MODE_AUTO:
+            too_big = len(dates) * len(shi_df) > BOARD_FULL_MAX_CELLS
+            board_mode = BOARD_MODE_WINDOW if too_big else BOARD_MODE_FULL
         
-        for i, date_str in enumerate(dates):
-            with cols[i]:
-                # כותרת היום
-                st.markdown(
-                    f'<div class="table-header">'
-                    f'<span class="day-name">{get_day_name(date_str)}</span>'
-                    f'<span class="date-val">{date_str}</span>'
-                    f'</div>', 
-                    unsafe_allow_html=True
-                )
-                
-                # משמרות היום
-                for idx, shift_row in shi_df.iterrows():
-                    shift_key = f"{date_str}_{shift_row['תחנה']}_{shift_row['משמרת']}_{idx}"
-                    assigned = st.session_state.final_schedule.get(shift_key)
-                    cancelled = shift_key in st.session_state.cancelled_shifts
-                    
-                    # קביעת סגנון לפי סוג תקן
-                    style_class = "type-atan" if "אט" in str(shift_row['סוג תקן']) else "type-standard"
-                    
-                    st.markdown('<div class="shift-container">', unsafe_allow_html=True)
-                    
-                    # כרטיס משמרת
-                    st.markdown(
-                        f'<div class="shift-card {style_class}">'
-                        f'<div class="shift-info">'
-                        f'{escape(str(shift_row["משמרת"]))} | {escape(str(shift_row["סוג תקן"]))}<br>'
-                        f'{escape(str(shift_row["תחנה"]))}'
-                        f'</div></div>', 
-                        unsafe_allow_html=True
-                    )
-                    
-                    # סטטוס ופעולות
-                    if cancelled:
-                        st.caption("🚫 משמרת מבוטלת")
-                        if st.button("🔄 שחזר", key=f"restore_{shift_key}", use_container_width=True):
-                            st.session_state.cancelled_shifts.remove(shift_key)
-                            logger.info(f"Shift restored: {shift_key}")
-                            st.rerun()
-                    
-                    elif assigned:
-                        st.success(f"👤 {assigned}")
-                        col1, col2 = st.columns([3, 1])
-                        with col1:
-                            if st.button("🗑️ הסר", key=f"remove_{shift_key}", use_container_width=True):
-                                st.session_state.assigned_today[date_str].discard(assigned)
-                                del st.session_state.final_schedule[shift_key]
-                                logger.info(f"Assignment removed: {shift_key}")
-                                st.rerun()
-                        with col2:
-                            if st.button("✏️", key=f"edit_{shift_key}", use_container_width=True):
-                                st.session_state.assigned_today[date_str].discard(assigned)
-                                del st.session_state.final_schedule[shift_key]
-                                show_manual_picker(shift_key, date_str, shift_row, req_df, global_balance)
-                    
-                    else:
-                        st.error("⚠️ חסר שיבוץ")
-                        col1, col2 = st.columns([3, 1])
-                        with col1:
-                            if st.button("➕ שבץ", key=f"assign_{shift_key}", use_container_width=True):
-                                show_manual_picker(shift_key, date_str, shift_row, req_df, global_balance)
-                        with col2:
-                            if st.button("🚫", key=f"cancel_{shift_key}", use_container_width=True):
-                                st.session_state.cancelled_shifts.add(shift_key)
-                                logger.info(f"Shift cancelled: {shift_key}")
-                                st.rerun()
+        with span('render', mode=board_mode, cells=len(dates) * len(shi_df)):
+            if board_mode == BOARD_MODE_WINDOW:
+                render_board_window(dates, day_names, shi_df, upload.index, global_balance)
+            else:
+                cols = st.columns(len(dates))
+            
+                for i, date_str in enumerate(dates):
+                    with cols[i]:
+                        # כותרת היום
+                        st.markdown(
+                            f'<div class="table-header">'
+                            f'<span class="day-name">{day_names.get(date_str, "")}</span>'
+                            f'<span class="date-val">{date_str}</span>'
+                            f'</div>', 
+                            unsafe_allow_html=True
+                        )
                     
-                    st.markdown('</div>', unsafe_allow_html=True)
+                        # משמרות היום
+                        for idx, shift_row in shi_df.iterrows():
+                            shift_key = SlotKey.from_row(date_str, shift_row, idx)
+                        
+                            # קביעת סגנון לפי סוג תקן
+                            style_class = "type-atan" if "אט" in str(shift_row['סוג תקן']) else "type-standard"
+                        
+                            st.markdown('<div class="shift-container">', unsafe_allow_html=True)
+                        
+                            # כרטיס משמרת
+                            st.markdown(
+                                f'<div class="shift-card {style_class}">'
+                                f'<div class="shift-info">'
+                                f'{escape(str(shift_row["משמרת"]))} | {escape(str(shift_row["סוג תקן"]))}<br>'
+                                f'{escape(str(shift_row["תחנה"]))}'
+                                f'</div></div>', 
+                                unsafe_allow_html=True
+                            )
+                        
+                            # סטטוס ופעולות
+                            render_cell_actions(shift_key, date_str, shift_row, upload.index, global_balance)
+                        
+                            st.markdown('</div>', unsafe_allow_html=True)
+        
         
         # סיכום בתחתית
         st.markdown("---")
+        metrics = schedule_metrics(shi_df, dates, st.session_state.final_schedule,
+                                   st.session_state.cancelled_shifts)
         col1, col2, col3 = st.columns(3)
         with col1:
-            total_assigned = len(st.session_state.final_schedule)
-            total_shifts = len(shi_df) * len(dates) - len(st.session_state.cancelled_shifts)
-            st.metric("משמרות משובצות", f"{total_assigned}/{total_shifts}")
+            st.metric("משמרות משובצות", f"{metrics['assigned']}/{metrics['total']}")
         with col2:
-            completion = (total_assigned / total_shifts * 100) if total_shifts > 0 else 0
-            st.metric("אחוז השלמה", f"{completion:.1f}%")
+            st.metric("אחוז השלמה", f"{metrics['completion']:.1f}%")
         with col3:
-            missing = total_shifts - total_assigned
-            st.metric("משמרות חסרות", missing)
+            st.metric("משמרות חסרות", metrics['missing'])
+        
+        autosave_draft()
         
     except Exception as e:
         st.error(f"❌ שגיאה בעיבוד הקבצים: {str(e)}")
@@ -700,3 +1004,8 @@ else:
         
         **תבנית משמרות:** תחנה, משמרת, סוג תקן
         """)
+
+# פאנל הביצועים בסוף ההרצה - כשכל המקטעים שלה כבר נמדדו
+if st.session_state.get('show_perf'):
+    with st.sidebar.expander("⏱️ ביצועים", expanded=True):
+        render_perf_panel()
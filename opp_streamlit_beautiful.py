@@ -6,22 +6,17 @@
 
 import streamlit as st
 import pandas as pd
-import firebase_admin
-from firebase_admin import credentials, firestore
 from datetime import datetime
 import logging
 
+from shibutz import (
+    SlotKey, CandidateIndex, FirestoreStorage, UPLOAD_TYPES, parse_date_safe, get_day_name,
+    validate_dataframes, auto_assign, read_table, connect_firestore
+)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-REQUIRED_REQUEST_COLUMNS = ['שם', 'תאריך מבוקש', 'משמרת', 'תחנה']
-REQUIRED_SHIFT_COLUMNS = ['תחנה', 'משמרת', 'סוג תקן']
-DAYS_HEB = {
-    'Sunday': 'ראשון', 'Monday': 'שני', 'Tuesday': 'שלישי',
-    'Wednesday': 'רביעי', 'Thursday': 'חמישי', 'Friday': 'שישי', 'Saturday': 'שבת'
-}
-DATE_FORMATS = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y']
-
 st.set_page_config(page_title="מערכת שיבוץ מבצעית 2026", page_icon="📅", layout="wide")
 
 # CSS מותאם ללוח שנה
@@ -123,129 +118,62 @@ h1 {
 </style>
 """, unsafe_allow_html=True)
 
-# Firebase
-def initialize_firebase():
-    if not firebase_admin._apps:
-        try:
-            cred = credentials.Certificate(dict(st.secrets["firebase"]))
-            firebase_admin.initialize_app(cred)
-        except:
-            return None
-    return firestore.client()
-
-db = initialize_firebase()
+# Firebase - מנוע אחסון אחד לכל תהליך השרת, עם מטמון מאזן משותף לכל הסשנים
+@st.cache_resource
+def get_storage():
+    try:
+        return FirestoreStorage(connect_firestore(dict(st.secrets["firebase"])))
+    except Exception as e:
+        logger.error(f"Firebase unavailable: {e}")
+        return None
 
 # פונקציות
-def parse_date_safe(date_str):
-    for fmt in DATE_FORMATS:
-        try:
-            return datetime.strptime(str(date_str).strip(), fmt)
-        except ValueError:
-            continue
-    raise ValueError(f"פורמט תאריך לא תקין: {date_str}")
-
-def get_day_name(date_str):
-    try:
-        return DAYS_HEB.get(parse_date_safe(date_str).strftime('%A'), "")
-    except:
-        return ""
-
-def validate_dataframes(req_df, shi_df):
-    errors = []
-    if set(REQUIRED_REQUEST_COLUMNS) - set(req_df.columns):
-        errors.append("❌ עמודות חסרות בקובץ בקשות")
-    if set(REQUIRED_SHIFT_COLUMNS) - set(shi_df.columns):
-        errors.append("❌ עמודות חסרות בתבנית משמרות")
-    return errors
-
-def get_atan_column(df):
-    cols = [c for c in df.columns if "אט" in c and "מורשה" in c]
-    return cols[0] if cols else None
-
-@st.cache_data(ttl=60)
+def get_candidate_index(req_df, upload_id):
+    if st.session_state.get('candidate_index_upload') != upload_id:
+        st.session_state.candidate_index = CandidateIndex(req_df)
+        st.session_state.candidate_index_upload = upload_id
+    return st.session_state.candidate_index
+
 def get_balance():
-    scores = {}
+    """המאזן מהמטמון המשותף - מתעדכן בדחיפה מ-Firestore, בלי סריקה בכל קריאה"""
+    storage = get_storage()
+    if storage is None:
+        return {}
     try:
-        if db:
-            for doc in db.collection('employee_history').stream():
-                scores[doc.id] = doc.to_dict().get('total_shifts', 0)
-    except:
-        pass
-    return scores
-
-def auto_assign(dates, shi_df, req_df, balance):
-    temp_schedule, temp_assigned = {}, {d: set() for d in dates}
-    running_balance = balance.copy()
-    atan_col = get_atan_column(req_df)
-    
-    for date_str in dates:
-        for idx, shift_row in shi_df.iterrows():
-            shift_key = f"{date_str}_{shift_row['תחנה']}_{shift_row['משמרת']}_{idx}"
-            if shift_key in st.session_state.cancelled_shifts:
-                continue
-            
-            potential = req_df[
-                (req_df['תאריך מבוקש'] == date_str) &
-                (req_df['משמרת'] == shift_row['משמרת']) &
-                (req_df['תחנה'] == shift_row['תחנה']) &
-                (~req_df['שם'].isin(temp_assigned[date_str]))
-            ].copy()
-            
-            if "אט" in str(shift_row['סוג תקן']) and atan_col:
-                potential = potential[potential[atan_col] == 'כן']
-            
-            if not potential.empty:
-                potential['score'] = potential['שם'].map(lambda x: running_balance.get(x, 0))
-                best = potential.sort_values('score').iloc[0]['שם']
-                temp_schedule[shift_key] = best
-                temp_assigned[date_str].add(best)
-                running_balance[best] = running_balance.get(best, 0) + 1
-    
-    return temp_schedule, temp_assigned
+        return storage.load_balance()
+    except Exception as e:
+        logger.error(f"Failed to load balance: {e}")
+        return {}
 
 @st.dialog("שיבוץ עובד")
-def show_assignment_dialog(shift_key, date_str, station, shift_type, req_df, balance, shi_df):
-    st.markdown(f"### {get_day_name(date_str)} - {date_str}")
-    st.write(f"**{station}** | **{shift_type}**")
+def show_assignment_dialog(shift_key, is_atan, index, balance):
+    st.markdown(f"### {get_day_name(shift_key.date)} - {shift_key.date}")
+    st.write(f"**{shift_key.station}** | **{shift_key.shift}**")
+    date_str = shift_key.date
     
     # בדיקה בטוחה של assigned_today
     if not isinstance(st.session_state.assigned_today, dict):
         st.session_state.assigned_today = {}
     
+    # מועמדים מהאינדקס (כולל סינון אט"ן) - בלי לסנן את כל טבלת הבקשות
     already_working = st.session_state.assigned_today.get(date_str, set())
-    candidates = req_df[
-        (req_df['תאריך מבוקש'] == date_str) &
-        (req_df['משמרת'] == shift_type) &
-        (req_df['תחנה'] == station) &
-        (~req_df['שם'].isin(already_working))
-    ].copy()
-    
-    # בדיקת אט"ן - חיפוש המשמרת בתבנית
-    shift_row = None
-    for idx, s in shi_df.iterrows():
-        test_key = f"{date_str}_{s['תחנה']}_{s['משמרת']}_{idx}"
-        if test_key == shift_key:
-            shift_row = s
-            break
-    
-    if shift_row is not None and "אט" in str(shift_row['סוג תקן']):
-        atan_col = get_atan_column(req_df)
-        if atan_col:
-            candidates = candidates[candidates[atan_col] == 'כן']
+    candidates = [
+        n for n in dict.fromkeys(index.candidates(date_str, shift_key.station, shift_key.shift, atan_only=is_atan))
+        if n not in already_working
+    ]
     
-    if candidates.empty:
+    if not candidates:
         st.warning("😕 אין מועמדים פנויים")
         if st.button("סגור", type="secondary", use_container_width=True):
             st.rerun()
     else:
-        candidates['balance'] = candidates['שם'].map(lambda x: balance.get(x, 0))
-        candidates = candidates.sort_values('balance')
+        candidates.sort(key=lambda x: balance.get(x, 0))
         
         selected = st.radio(
             "בחר עובד:",
-            options=candidates['שם'].tolist(),
+            options=candidates,
             format_func=lambda x: f"👤 {x} (מאזן: {balance.get(x, 0)})",
-            key=f"radio_{shift_key}"
+            key=f"radio_{shift_key.to_id()}"
         )
         
         col1, col2 = st.columns(2)
@@ -274,8 +202,8 @@ if 'current_shifts_df' not in st.session_state:
 # Sidebar
 with st.sidebar:
     st.markdown("# ⚙️ ניהול")
-    req_file = st.file_uploader("📁 קובץ בקשות", type=['csv'])
-    shi_file = st.file_uploader("📋 תבנית משמרות", type=['csv'])
+    req_file = st.file_uploader("📁 קובץ בקשות", type=UPLOAD_TYPES)
+    shi_file = st.file_uploader("📋 תבנית משמרות", type=UPLOAD_TYPES)
     
     st.divider()
     
@@ -291,8 +219,7 @@ with st.sidebar:
         if st.button("📥 ייצוא", use_container_width=True):
             export_data = []
             for shift_key, employee in st.session_state.final_schedule.items():
-                parts = shift_key.split('_')
-                export_data.append({'תאריך': parts[0], 'תחנה': parts[1], 'משמרת': parts[2], 'עובד': employee})
+                export_data.append({'תאריך': shift_key.date, 'תחנה': shift_key.station, 'משמרת': shift_key.shift, 'עובד': employee})
             csv = pd.DataFrame(export_data).to_csv(index=False, encoding='utf-8-sig')
             st.download_button("⬇️ הורד", csv, f"shibutz_{datetime.now().strftime('%Y%m%d')}.csv", use_container_width=True)
     
@@ -305,8 +232,8 @@ st.title("📅 לוח שיבוצים")
 
 if req_file and shi_file:
     try:
-        req_df = pd.read_csv(req_file, encoding='utf-8-sig')
-        shi_df = pd.read_csv(shi_file, encoding='utf-8-sig')
+        req_df = read_table(req_file)
+        shi_df = read_table(shi_file)
         
         errors = validate_dataframes(req_df, shi_df)
         if errors:
@@ -314,12 +241,14 @@ if req_file and shi_file:
             st.stop()
         
         dates = sorted(req_df['תאריך מבוקש'].unique(), key=parse_date_safe)
+        index = get_candidate_index(req_df, req_file.file_id)
         balance = get_balance()
         st.session_state.current_shifts_df = shi_df
         
         if st.session_state.get('trigger_auto'):
             with st.spinner('מבצע שיבוץ...'):
-                temp_schedule, temp_assigned = auto_assign(dates, shi_df, req_df, balance)
+                temp_schedule, temp_assigned = auto_assign(dates, shi_df, req_df, balance, index,
+                                                             cancelled=st.session_state.cancelled_shifts)
                 st.session_state.final_schedule, st.session_state.assigned_today = temp_schedule, temp_assigned
                 st.session_state.trigger_auto = False
             st.success(f"✅ {len(st.session_state.final_schedule)} משמרות שובצו")
@@ -368,7 +297,7 @@ if req_file and shi_file:
             
             for i, d in enumerate(dates[:7]):
                 with shift_cols[i]:
-                    key = f"{d}_{s['תחנה']}_{s['משמרת']}_{idx}"
+                    key = SlotKey.from_row(d, s, idx)
                     assigned = st.session_state.final_schedule.get(key)
                     cancelled = key in st.session_state.cancelled_shifts
                     is_atan = "אט" in str(s['סוג תקן'])
@@ -387,12 +316,12 @@ if req_file and shi_file:
                     # סטטוס וכפתורים
                     if cancelled:
                         st.markdown('<div class="shift-status status-cancelled">🚫 מבוטל</div></div>', unsafe_allow_html=True)
-                        if st.button("🔄 שחזר", key=f"restore_{key}", use_container_width=True):
+                        if st.button("🔄 שחזר", key=f"restore_{key.to_id()}", use_container_width=True):
                             st.session_state.cancelled_shifts.remove(key)
                             st.rerun()
                     elif assigned:
                         st.markdown(f'<div class="shift-status status-assigned">👤 {assigned}</div></div>', unsafe_allow_html=True)
-                        if st.button("🗑️ הסר", key=f"remove_{key}", use_container_width=True):
+                        if st.button("🗑️ הסר", key=f"remove_{key.to_id()}", use_container_width=True):
                             del st.session_state.final_schedule[key]
                             if d in st.session_state.assigned_today:
                                 st.session_state.assigned_today[d].discard(assigned)
@@ -401,10 +330,10 @@ if req_file and shi_file:
                         st.markdown('<div class="shift-status status-empty">⚠️ חסר</div></div>', unsafe_allow_html=True)
                         col_a, col_b = st.columns([3, 1])
                         with col_a:
-                            if st.button("➕ שבץ", key=f"add_{key}", use_container_width=True):
-                                show_assignment_dialog(key, d, s['תחנה'], s['משמרת'], req_df, balance, shi_df)
+                            if st.button("➕ שבץ", key=f"add_{key.to_id()}", use_container_width=True):
+                                show_assignment_dialog(key, is_atan, index, balance)
                         with col_b:
-                            if st.button("🚫", key=f"cancel_{key}"):
+                            if st.button("🚫", key=f"cancel_{key.to_id()}"):
                                 st.session_state.cancelled_shifts.add(key)
                                 st.rerun()
         
@@ -0,0 +1,38 @@
+"""ליבת מערכת השיבוץ - ללא תלות ב-Streamlit.
+
+הספרייה כוללת את פענוח הקלט, הוולידציה, אלגוריתמי השיבוץ והאחסון, וניתנת לייבוא
+מהרצות אצווה ומדידות. firebase_admin, scipy ו-pyarrow נטענים רק כשמשתמשים בהם.
+"""
+
+from .constants import (
+    REQUIRED_REQUEST_COLUMNS, REQUIRED_SHIFT_COLUMNS, DAYS_HEB, DATE_FORMATS,
+    DATE_COLUMN, DAY_NAME_COLUMN, DAY_ORDINAL_COLUMN, SHIFT_START_COLUMN, SHIFT_END_COLUMN
+)
+from .slots import SlotKey
+from .timing import span, timed, start_recording
+from .constraints import ShiftRules, ShiftConstraints, parse_time_of_day, get_shift_times
+from .formats import (
+    FORMAT_CSV, FORMAT_XLSX, FORMAT_PARQUET, FORMAT_ARROW, TABLE_FORMATS, FORMAT_LABELS,
+    FORMAT_MIME, UPLOAD_TYPES, detect_format, named_buffer, read_table, iter_table_chunks,
+    write_table, table_bytes
+)
+from .dates import parse_date_safe, get_day_name, parse_dates, normalize_request_dates, get_sorted_dates
+from .data import validate_dataframes, get_atan_column, compact_requests, UploadData, load_tables
+from .engine import (
+    ENGINE_GREEDY, ENGINE_OPTIMAL, ENGINE_PARALLEL, ENGINE_LABELS, ENGINES,
+    CandidateIndex, SlotHeap, get_shift_rows, auto_assign, auto_assign_optimal, fill_holes,
+    schedule_metrics
+)
+from .parallel import auto_assign_parallel, partition_by_week
+from .storage import (
+    STORAGE_FIRESTORE, STORAGE_SQLITE, DEFAULT_SQLITE_PATH,
+    ScheduleStorage, ScheduleDelta, FirestoreStorage, SQLiteStorage, BalanceCache,
+    connect_firestore, open_storage, commit_in_chunks, commit_chunks, schedule_records, count_shifts,
+    schedule_delta
+)
+from .drafts import (
+    DEFAULT_DRAFTS_PATH, DEFAULT_UNIT, Draft, DraftInfo, DraftStore,
+    draft_key, draft_fingerprint, encode_draft, decode_draft
+)
+from .board import build_board_html
+from .batch import Unit, run_unit, run_batch, schedule_frame, SummaryWriter
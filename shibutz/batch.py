@@ -0,0 +1,172 @@
+"""שיבוץ אצווה - כמה יחידות במקביל, כל יחידה נכתבת לקובץ משלה מיד בסיומה"""
+
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import pandas as pd
+
+from .constraints import ShiftConstraints, ShiftRules
+from .data import load_tables
+from .engine import ENGINE_GREEDY, ENGINES, schedule_metrics
+from .formats import (
+    FORMAT_ARROW, FORMAT_CSV, FORMAT_EXTENSIONS, FORMAT_PARQUET, FORMAT_XLSX, TABLE_FORMATS,
+    write_table
+)
+from .slots import SlotKey
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = TABLE_FORMATS
+
+# קובץ הסיכום נכתב לצד קבצי היחידות - השם שמור ואינו יכול לשמש ליחידה
+SUMMARY_NAME = "_summary"
+
+SCHEDULE_COLUMNS = ['תאריך', 'תחנה', 'משמרת', 'עובד']
+SUMMARY_COLUMNS = ['יחידה', 'סך משמרות', 'משובצות', 'חסרות', 'אחוז השלמה', 'שניות', 'שגיאה']
+
+class Unit(NamedTuple):
+    """יחידה להרצה: שם וקבצי הקלט שלה (כמו בהעלאה באפליקציה)"""
+    name: str
+    requests: str
+    shifts: str
+
+def unit_name_error(name) -> Optional[str]:
+    """שם היחידה הוא שם קובץ הפלט שלה: בלי תיקיות ובלי לדרוס את קובץ הסיכום"""
+    if not isinstance(name, str) or not name.strip():
+        return f"empty unit name: {name!r}"
+    separators = {'/', '\\', '\0', os.sep, os.altsep} - {None}
+    if name in ('.', '..') or any(sep in name for sep in separators):
+        return f"unit name {name!r} must be a plain file name"
+    if name.casefold() == SUMMARY_NAME.casefold():
+        return f"unit name {name!r} is reserved for the summary file"
+    return None
+
+def output_path(out_dir: str, name: str, fmt: str) -> str:
+    return os.path.join(out_dir, f"{name}.{FORMAT_EXTENSIONS[fmt][0]}")
+
+def schedule_frame(schedule: Dict[SlotKey, str]) -> pd.DataFrame:
+    """השיבוץ כטבלה - אותן עמודות כמו בייצוא מהאפליקציה"""
+    return pd.DataFrame(
+        [(key.date, key.station, key.shift, name) for key, name in schedule.items()],
+        columns=SCHEDULE_COLUMNS
+    )
+
+def summary_row(unit: str, metrics: Optional[Dict] = None, seconds: float = 0.0,
+                error: str = "") -> Dict:
+    """שורת סיכום ליחידה - מדדי השורה התחתונה באפליקציה"""
+    metrics = metrics or {'total': 0, 'assigned': 0, 'missing': 0, 'completion': 0.0}
+    return {
+        'יחידה': unit,
+        'סך משמרות': int(metrics['total']),
+        'משובצות': int(metrics['assigned']),
+        'חסרות': int(metrics['missing']),
+        'אחוז השלמה': round(float(metrics['completion']), 1),
+        'שניות': round(seconds, 3),
+        'שגיאה': error
+    }
+
+def run_unit(unit: Unit, engine: str, balance: Dict[str, int], out_dir: str,
+             fmt: str = FORMAT_CSV, rules: Optional[ShiftRules] = None) -> Dict:
+    """שיבוץ יחידה אחת וכתיבת השיבוץ שלה לקובץ; מחזיר רק את שורת הסיכום"""
+    start = time.perf_counter()
+    upload = load_tables(unit.requests, unit.shifts)
+    if upload.errors:
+        return summary_row(unit.name, seconds=time.perf_counter() - start,
+                           error=' | '.join(upload.errors))
+
+    schedule, _ = ENGINES[engine](upload.dates, upload.shi_df, upload.req_df, balance,
+                                  index=upload.index,
+                                  constraints=ShiftConstraints(upload.shi_df, rules))
+    write_table(schedule_frame(schedule), output_path(out_dir, unit.name, fmt), fmt)
+
+    metrics = schedule_metrics(upload.shi_df, upload.dates, schedule)
+    logger.info(f"Unit {unit.name}: {metrics['assigned']}/{metrics['total']} assigned")
+    return summary_row(unit.name, metrics, time.perf_counter() - start)
+
+def run_batch(units: List[Unit], engine: str = ENGINE_GREEDY,
+              balance: Optional[Dict[str, int]] = None, out_dir: str = ".",
+              fmt: str = FORMAT_CSV, workers: Optional[int] = None,
+              rules: Optional[ShiftRules] = None) -> Iterator[Dict]:
+    """הרצת כל היחידות (במאגר תהליכים) והחזרת שורות סיכום לפי סדר הסיום"""
+    errors = [error for error in map(unit_name_error, (unit.name for unit in units)) if error]
+    if errors:
+        raise ValueError('; '.join(errors))
+    balance = balance or {}
+    os.makedirs(out_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, len(units))
+
+    # יחידה אחת או עובד אחד - אין טעם להרים תהליכים
+    if workers <= 1:
+        for unit in units:
+            try:
+                yield run_unit(unit, engine, balance, out_dir, fmt, rules)
+            except Exception as e:
+                logger.error(f"Unit {unit.name} failed: {e}")
+                yield summary_row(unit.name, error=str(e))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_unit, unit, engine, balance, out_dir, fmt, rules): unit
+            for unit in units
+        }
+        for future in as_completed(futures):
+            unit = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                logger.error(f"Unit {unit.name} failed: {e}")
+                yield summary_row(unit.name, error=str(e))
+
+class SummaryWriter:
+    """כתיבת קובץ הסיכום שורה אחר שורה - כל יחידה נרשמת מיד כשהיא מסתיימת.
+    Excel אינו ניתן להוספה בהדרגה, ולכן בו השורות נאספות ונכתבות בסגירה"""
+
+    def __init__(self, path: str, fmt: str = FORMAT_CSV):
+        self.path = path
+        self.fmt = fmt
+        self._writer = None
+        self._file = None
+        self._rows: List[Dict] = []
+        if fmt in (FORMAT_PARQUET, FORMAT_ARROW):
+            import pyarrow as pa
+            self._schema = pa.schema([
+                ('יחידה', pa.string()), ('סך משמרות', pa.int64()), ('משובצות', pa.int64()),
+                ('חסרות', pa.int64()), ('אחוז השלמה', pa.float64()), ('שניות', pa.float64()),
+                ('שגיאה', pa.string())
+            ])
+            if fmt == FORMAT_PARQUET:
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(path, self._schema)
+        elif fmt == FORMAT_CSV:
+            self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+            pd.DataFrame(columns=SUMMARY_COLUMNS).to_csv(self._file, index=False)
+
+    def write(self, row: Dict) -> None:
+        if self._writer is not None:
+            import pyarrow as pa
+            self._writer.write_table(pa.Table.from_pylist([row], schema=self._schema))
+        elif self._file is not None:
+            pd.DataFrame([row], columns=SUMMARY_COLUMNS).to_csv(self._file, index=False, header=False)
+            self._file.flush()
+        else:
+            self._rows.append(row)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+        if self.fmt == FORMAT_XLSX:
+            write_table(pd.DataFrame(self._rows, columns=SUMMARY_COLUMNS), self.path, self.fmt)
+
+    def __enter__(self) -> 'SummaryWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
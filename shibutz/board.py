@@ -0,0 +1,41 @@
+"""בניית לוח השיבוצים כטבלת HTML (ללא תלות ב-Streamlit)"""
+
+from html import escape
+from typing import Dict, List, Set
+
+import pandas as pd
+
+from .slots import SlotKey
+
+def build_board_html(dates: List[str], day_names: Dict[str, str], view: pd.DataFrame,
+                     schedule: Dict[SlotKey, str], cancelled_shifts: Set[SlotKey]) -> str:
+    """בניית הלוח כטבלת HTML אחת לקריאה בלבד (ללא ווידג'טים)"""
+    header = ''.join(
+        f'<th><span class="day-name">{escape(day_names.get(d, ""))}</span>'
+        f'<span class="date-val">{escape(str(d))}</span></th>'
+        for d in dates
+    )
+    
+    body = []
+    for idx, station, shift, kind in zip(view.index, view['תחנה'], view['משמרת'], view['סוג תקן']):
+        style_class = "type-atan" if "אט" in str(kind) else "type-standard"
+        cells = [
+            f'<th class="board-shift {style_class}">'
+            f'{escape(str(shift))} | {escape(str(kind))}<br>{escape(str(station))}</th>'
+        ]
+        for date_str in dates:
+            shift_key = SlotKey(date_str, station, shift, int(idx))
+            assigned = schedule.get(shift_key)
+            if shift_key in cancelled_shifts:
+                cells.append('<td class="cell-cancelled">🚫 מבוטלת</td>')
+            elif assigned:
+                cells.append(f'<td class="cell-assigned">👤 {escape(str(assigned))}</td>')
+            else:
+                cells.append('<td class="cell-missing">⚠️ חסר</td>')
+        body.append(f'<tr>{"".join(cells)}</tr>')
+    
+    return (
+        f'<div class="board-wrapper"><table class="board-table">'
+        f'<thead><tr><th></th>{header}</tr></thead>'
+        f'<tbody>{"".join(body)}</tbody></table></div>'
+    )
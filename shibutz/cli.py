@@ -0,0 +1,123 @@
+"""שורת פקודה לשיבוץ אצווה: python -m shibutz --unit NAME REQUESTS SHIFTS ..."""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from .batch import (
+    FORMAT_CSV, OUTPUT_FORMATS, SUMMARY_NAME, SummaryWriter, Unit, output_path, run_batch,
+    unit_name_error
+)
+from .constraints import ShiftRules
+from .engine import ENGINE_GREEDY, ENGINES
+from .storage import DEFAULT_SQLITE_PATH, STORAGE_FIRESTORE, STORAGE_SQLITE, open_storage
+
+logger = logging.getLogger(__name__)
+
+STORAGE_NONE = "none"
+
+def read_manifest(path: str) -> List[Unit]:
+    """קובץ יחידות (CSV עם העמודות unit, requests, shifts); נתיבים יחסיים - ביחס לקובץ"""
+    base = os.path.dirname(os.path.abspath(path))
+    manifest = pd.read_csv(path, encoding='utf-8-sig', dtype=str)
+    missing = {'unit', 'requests', 'shifts'} - set(manifest.columns)
+    if missing:
+        raise ValueError(f"Manifest {path} is missing columns: {', '.join(sorted(missing))}")
+    return [
+        Unit(name, os.path.join(base, requests), os.path.join(base, shifts))
+        for name, requests, shifts in zip(manifest['unit'], manifest['requests'], manifest['shifts'])
+    ]
+
+def load_start_balance(args: argparse.Namespace) -> Dict[str, int]:
+    """מאזן הפתיחה של העובדים ממנוע האחסון (אם נבחר)"""
+    if args.storage == STORAGE_NONE:
+        return {}
+    credentials_info = None
+    if args.storage == STORAGE_FIRESTORE:
+        if not args.credentials:
+            raise ValueError("--credentials is required with --storage firestore")
+        with open(args.credentials, encoding='utf-8') as f:
+            credentials_info = json.load(f)
+    # קריאה אחת - אין טעם להאזין לעדכונים
+    storage = open_storage(args.storage, args.sqlite_path, credentials_info, listen=False)
+    return storage.load_balance()
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m shibutz",
+        description="שיבוץ אצווה לכמה יחידות במקביל"
+    )
+    parser.add_argument("--unit", nargs=3, action="append", default=[],
+                        metavar=("NAME", "REQUESTS", "SHIFTS"),
+                        help="יחידה להרצה: שם, קובץ בקשות ותבנית משמרות (ניתן לחזור)")
+    parser.add_argument("--manifest", help="קובץ CSV עם העמודות unit, requests, shifts")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default=ENGINE_GREEDY)
+    parser.add_argument("--out-dir", default="output", help="תיקיית הפלט")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=FORMAT_CSV)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="מספר תהליכים (ברירת מחדל: מספר המעבדים)")
+    parser.add_argument("--max-per-day", type=int, default=1,
+                        help="מקסימום משמרות לעובד ביום (רק משמרות שאינן חופפות)")
+    parser.add_argument("--min-rest-hours", type=float, default=0.0,
+                        help="מנוחה מינימלית בין משמרות (דורש שעות בתבנית)")
+    parser.add_argument("--max-shifts-per-week", type=int, default=0, help="0 - ללא הגבלה")
+    parser.add_argument("--max-hours-per-week", type=float, default=0.0, help="0 - ללא הגבלה")
+    parser.add_argument("--max-shifts-per-month", type=int, default=0, help="0 - ללא הגבלה")
+    parser.add_argument("--max-hours-per-month", type=float, default=0.0, help="0 - ללא הגבלה")
+    parser.add_argument("--storage", choices=[STORAGE_NONE, STORAGE_SQLITE, STORAGE_FIRESTORE],
+                        default=STORAGE_NONE, help="מקור מאזן הפתיחה של העובדים")
+    parser.add_argument("--sqlite-path", default=DEFAULT_SQLITE_PATH)
+    parser.add_argument("--credentials", help="קובץ JSON של Service Account (ל-Firestore)")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    units = [Unit(*spec) for spec in args.unit]
+    if args.manifest:
+        units.extend(read_manifest(args.manifest))
+    if not units:
+        parser.error("no units given (use --unit or --manifest)")
+    for unit in units:
+        error = unit_name_error(unit.name)
+        if error:
+            parser.error(error)
+    names = [unit.name for unit in units]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        parser.error(f"duplicate unit names: {', '.join(duplicates)}")
+
+    balance = load_start_balance(args)
+    rules = ShiftRules(args.max_per_day, args.min_rest_hours,
+                       args.max_shifts_per_week, args.max_hours_per_week,
+                       args.max_shifts_per_month, args.max_hours_per_month)
+    summary_path = output_path(args.out_dir, SUMMARY_NAME, args.format)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    failed = 0
+    with SummaryWriter(summary_path, args.format) as summary:
+        for row in run_batch(units, args.engine, balance, args.out_dir, args.format,
+                             args.workers, rules):
+            summary.write(row)
+            if row['שגיאה']:
+                failed += 1
+                print(f"❌ {row['יחידה']}: {row['שגיאה']}")
+            else:
+                print(f"✅ {row['יחידה']}: {row['משובצות']}/{row['סך משמרות']} "
+                      f"({row['אחוז השלמה']}%) ב-{row['שניות']} שניות")
+
+    print(f"סיכום נכתב ל-{summary_path}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
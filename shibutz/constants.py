@@ -0,0 +1,22 @@
+"""קבועים משותפים - שמות עמודות, פורמטי תאריכים וימים בעברית"""
+
+REQUIRED_REQUEST_COLUMNS = ['שם', 'תאריך מבוקש', 'משמרת', 'תחנה']
+REQUIRED_SHIFT_COLUMNS = ['תחנה', 'משמרת', 'סוג תקן']
+DAYS_HEB = {
+    'Sunday': 'ראשון', 
+    'Monday': 'שני', 
+    'Tuesday': 'שלישי', 
+    'Wednesday': 'רביעי', 
+    'Thursday': 'חמישי', 
+    'Friday': 'שישי', 
+    'Saturday': 'שבת'
+}
+DATE_FORMATS = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d.%m.%Y']
+# עמודות עזר שמחושבות פעם אחת בטעינת קובץ הבקשות
+DATE_COLUMN = '_date'
+DAY_NAME_COLUMN = '_day_name'
+# מספר היום בלוח השנה (date.toordinal) - מחליף את עמודת התאריך המפוענח בייצוא המצומצם
+DAY_ORDINAL_COLUMN = '_day_ordinal'
+# עמודות אופציונליות בתבנית המשמרות - שעות התחלה וסיום (HH:MM) לבדיקת מנוחה וחפיפה
+SHIFT_START_COLUMN = 'שעת התחלה'
+SHIFT_END_COLUMN = 'שעת סיום'
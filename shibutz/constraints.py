@@ -0,0 +1,258 @@
+"""אילוצי שיבוץ לעובד: מספר משמרות מרבי ביום, מנוחה מינימלית ומכסות שבועיות/חודשיות
+
+לכל עובד נשמרים מערכי התחלה וסיום ממוינים של המשמרות שלו, כך שבדיקת התנגשות
+היא חיפוש בינארי (O(log k)) ולא סריקה של כל השיבוצים. המכסות נספרות במערכי NumPy
+לפי מספר עובד ומספר שבוע/חודש, כך שבדיקת מכסה היא גישה ישירה לתא.
+"""
+
+import bisect
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .constants import SHIFT_START_COLUMN, SHIFT_END_COLUMN
+from .dates import parse_date_safe
+from .slots import SlotKey
+
+MINUTES_PER_DAY = 24 * 60
+
+class ShiftRules(NamedTuple):
+    """כללי השיבוץ; ברירת המחדל - משמרת אחת ביום, כמו תמיד. מכסה 0 - ללא הגבלה"""
+    max_per_day: int = 1
+    min_rest_hours: float = 0.0
+    max_shifts_per_week: int = 0
+    max_hours_per_week: float = 0.0
+    max_shifts_per_month: int = 0
+    max_hours_per_month: float = 0.0
+
+    @property
+    def has_caps(self) -> bool:
+        return any((self.max_shifts_per_week, self.max_hours_per_week,
+                    self.max_shifts_per_month, self.max_hours_per_month))
+
+def parse_time_of_day(value) -> Optional[int]:
+    """שעה בפורמט HH:MM לדקות מתחילת היום; None לערך ריק או לא תקין"""
+    if pd.isna(value):
+        return None
+    try:
+        hours, minutes = str(value).strip().split(':')[:2]
+        hours, minutes = int(hours), int(minutes)
+    except ValueError:
+        return None
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > MINUTES_PER_DAY:
+        return None
+    return hours * 60 + minutes
+
+def get_shift_times(shi_df: pd.DataFrame) -> Dict[int, Tuple[int, int]]:
+    """שעות המשמרת לכל שורת תבנית (דקות מתחילת יום המשמרת); סיום לפני התחלה - למחרת"""
+    if SHIFT_START_COLUMN not in shi_df.columns or SHIFT_END_COLUMN not in shi_df.columns:
+        return {}
+    times = {}
+    for idx, start, end in zip(shi_df.index, shi_df[SHIFT_START_COLUMN], shi_df[SHIFT_END_COLUMN]):
+        start_min, end_min = parse_time_of_day(start), parse_time_of_day(end)
+        if start_min is None or end_min is None:
+            continue
+        if end_min <= start_min:
+            end_min += MINUTES_PER_DAY
+        times[int(idx)] = (start_min, end_min)
+    return times
+
+def validate_shift_times(shi_df: pd.DataFrame) -> List[str]:
+    """ולידציה של עמודות השעות האופציונליות בתבנית"""
+    has_start = SHIFT_START_COLUMN in shi_df.columns
+    has_end = SHIFT_END_COLUMN in shi_df.columns
+    if not has_start and not has_end:
+        return []
+    if has_start != has_end:
+        return [f"❌ בתבנית משמרות צריכות להופיע שתי העמודות '{SHIFT_START_COLUMN}' ו-'{SHIFT_END_COLUMN}'"]
+    times = get_shift_times(shi_df)
+    bad = [str(pos + 2) for pos, idx in enumerate(shi_df.index) if int(idx) not in times]
+    if bad:
+        return [f"❌ שעות משמרת לא תקינות (HH:MM) בתבנית בשורות: {', '.join(bad)}"]
+    return []
+
+class PeriodCounts:
+    """משמרות ודקות לכל (עובד, תקופה) - מערכים דו-ממדיים שגדלים לפי הצורך"""
+
+    def __init__(self, max_shifts: int, max_hours: float):
+        self.max_shifts = max_shifts
+        self.max_minutes = int(max_hours * 60)
+        self._periods: Dict[Tuple, int] = {}
+        self.shifts = np.zeros((0, 0), dtype=np.int32)
+        self.minutes = np.zeros((0, 0), dtype=np.int32)
+
+    def column(self, period: Tuple) -> int:
+        col = self._periods.get(period)
+        if col is None:
+            col = self._periods[period] = len(self._periods)
+        return col
+
+    def _ensure(self, emp_id: int, col: int) -> None:
+        rows, cols = self.shifts.shape
+        if emp_id < rows and col < cols:
+            return
+        # הגדלה פי 2 - הקצאה מחדש נדירה גם כשמתווספים עובדים אחד-אחד
+        shape = (rows if emp_id < rows else max(2 * rows, emp_id + 1),
+                 cols if col < cols else max(2 * cols, col + 1))
+        for attr in ('shifts', 'minutes'):
+            grown = np.zeros(shape, dtype=np.int32)
+            grown[:rows, :cols] = getattr(self, attr)
+            setattr(self, attr, grown)
+
+    def allows(self, emp_id: int, col: int, minutes: int) -> bool:
+        """האם משמרת נוספת (באורך minutes) נשארת בתוך המכסה"""
+        rows, cols = self.shifts.shape
+        used_shifts = self.shifts[emp_id, col] if emp_id < rows and col < cols else 0
+        used_minutes = self.minutes[emp_id, col] if emp_id < rows and col < cols else 0
+        if self.max_shifts and used_shifts + 1 > self.max_shifts:
+            return False
+        if self.max_minutes and used_minutes + minutes > self.max_minutes:
+            return False
+        return True
+
+    def add(self, emp_id: int, col: int, minutes: int, sign: int = 1) -> None:
+        self._ensure(emp_id, col)
+        self.shifts[emp_id, col] += sign
+        self.minutes[emp_id, col] += sign * minutes
+
+class ShiftConstraints:
+    """מעקב אחר המשמרות של כל עובד ובדיקת כללי השיבוץ לפני הצבה"""
+
+    def __init__(self, shi_df: pd.DataFrame, rules: Optional[ShiftRules] = None):
+        self.rules = rules or ShiftRules()
+        self._times = get_shift_times(shi_df)
+        self._max_per_day = self.rules.max_per_day
+        self._rest = int(self.rules.min_rest_hours * 60)
+        self._day_start: Dict[str, int] = {}
+        
+        # מכסות לפי שבוע (ראשון-שבת) וחודש - רק אם הוגדרו
+        self._has_caps = self.rules.has_caps
+        self._emp_ids: Dict[str, int] = {}
+        self._periods: Dict[str, Tuple[int, int]] = {}
+        self._weekly = PeriodCounts(self.rules.max_shifts_per_week, self.rules.max_hours_per_week)
+        self._monthly = PeriodCounts(self.rules.max_shifts_per_month, self.rules.max_hours_per_month)
+        self._per_day: Dict[Tuple[str, str], int] = {}
+        self._starts: Dict[str, List[int]] = {}
+        self._ends: Dict[str, List[int]] = {}
+
+    @property
+    def has_times(self) -> bool:
+        return bool(self._times)
+
+    @classmethod
+    def from_schedule(cls, shi_df: pd.DataFrame, schedule: Dict[SlotKey, str],
+                      rules: Optional[ShiftRules] = None) -> 'ShiftConstraints':
+        """מעקב שנבנה משיבוץ קיים (למשל אחרי שינוי כללים או שיבוץ ידני)"""
+        constraints = cls(shi_df, rules)
+        for slot, name in schedule.items():
+            constraints.add(name, slot.date, slot.row)
+        return constraints
+
+    def _caps_key(self, name: str, date_str: str) -> Tuple[int, int, int]:
+        """(מספר עובד, עמודת שבוע, עמודת חודש) - מחושבים פעם אחת לכל עובד ותאריך"""
+        emp_id = self._emp_ids.get(name)
+        if emp_id is None:
+            emp_id = self._emp_ids[name] = len(self._emp_ids)
+        periods = self._periods.get(date_str)
+        if periods is None:
+            day = parse_date_safe(date_str)
+            # date.toordinal() % 7 == 0 ביום ראשון, כך ששבוע מתחיל בראשון
+            periods = (self._weekly.column((day.toordinal() // 7,)),
+                       self._monthly.column((day.year, day.month)))
+            self._periods[date_str] = periods
+        return emp_id, periods[0], periods[1]
+
+    def shift_minutes(self, row: int) -> int:
+        """אורך המשמרת בדקות (0 אם לא הוגדרו שעות - מכסת שעות לא חלה עליה)"""
+        times = self._times.get(row)
+        return times[1] - times[0] if times else 0
+
+    def within_caps(self, name: str, date_str: str, row: int) -> bool:
+        """האם משמרת נוספת משאירה את העובד בתוך המכסות השבועיות והחודשיות"""
+        if not self._has_caps:
+            return True
+        emp_id, week, month = self._caps_key(name, date_str)
+        minutes = self.shift_minutes(row)
+        return self._weekly.allows(emp_id, week, minutes) and self._monthly.allows(emp_id, month, minutes)
+
+    def shift_times(self, row: int) -> Optional[Tuple[int, int]]:
+        """שעות שורת התבנית (דקות מתחילת היום), או None אם לא הוגדרו"""
+        return self._times.get(row)
+
+    def interval(self, date_str: str, row: int) -> Optional[Tuple[int, int]]:
+        """טווח המשמרת בדקות מוחלטות (לפי מספר היום בלוח השנה)"""
+        times = self._times.get(row)
+        if times is None:
+            return None
+        day_start = self._day_start.get(date_str)
+        if day_start is None:
+            day_start = parse_date_safe(date_str).toordinal() * MINUTES_PER_DAY
+            self._day_start[date_str] = day_start
+        return day_start + times[0], day_start + times[1]
+
+    def can_assign(self, name: str, date_str: str, row: int) -> bool:
+        """האם אפשר לשבץ את העובד למשמרת בלי לעבור על הכללים"""
+        if self._per_day.get((name, date_str), 0) >= self._max_per_day:
+            return False
+        if self._has_caps and not self.within_caps(name, date_str, row):
+            return False
+        starts = self._starts.get(name)
+        if not starts:
+            return True
+        span = self.interval(date_str, row)
+        if span is None:
+            return True
+        start, end = span
+        # המשמרות של העובד לא חופפות, ולכן מספיק לבדוק את השכנות משני הצדדים
+        pos = bisect.bisect_left(starts, start)
+        if pos > 0 and self._ends[name][pos - 1] + self._rest > start:
+            return False
+        if pos < len(starts) and end + self._rest > starts[pos]:
+            return False
+        return True
+
+    def add(self, name: str, date_str: str, row: int) -> None:
+        """רישום שיבוץ של עובד למשמרת"""
+        key = (name, date_str)
+        self._per_day[key] = self._per_day.get(key, 0) + 1
+        self._count_caps(name, date_str, row, 1)
+        span = self.interval(date_str, row)
+        if span is None:
+            return
+        starts = self._starts.setdefault(name, [])
+        ends = self._ends.setdefault(name, [])
+        pos = bisect.bisect_left(starts, span[0])
+        starts.insert(pos, span[0])
+        ends.insert(pos, span[1])
+
+    def remove(self, name: str, date_str: str, row: int) -> None:
+        """ביטול רישום של שיבוץ (הסרה או החלפה ידנית)"""
+        key = (name, date_str)
+        count = self._per_day.get(key, 0)
+        if count <= 1:
+            self._per_day.pop(key, None)
+        else:
+            self._per_day[key] = count - 1
+        if count > 0:
+            self._count_caps(name, date_str, row, -1)
+        span = self.interval(date_str, row)
+        starts = self._starts.get(name)
+        if span is None or not starts:
+            return
+        ends = self._ends[name]
+        pos = bisect.bisect_left(starts, span[0])
+        while pos < len(starts) and starts[pos] == span[0]:
+            if ends[pos] == span[1]:
+                del starts[pos]
+                del ends[pos]
+                return
+            pos += 1
+
+    def _count_caps(self, name: str, date_str: str, row: int, sign: int) -> None:
+        if not self._has_caps:
+            return
+        emp_id, week, month = self._caps_key(name, date_str)
+        minutes = self.shift_minutes(row)
+        self._weekly.add(emp_id, week, minutes, sign)
+        self._monthly.add(emp_id, month, minutes, sign)
@@ -0,0 +1,201 @@
+"""טעינה וולידציה של קבצי הקלט (בקשות עובדים ותבנית משמרות)"""
+
+import logging
+from contextlib import closing
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from .constants import (
+    REQUIRED_REQUEST_COLUMNS, REQUIRED_SHIFT_COLUMNS, DATE_COLUMN, DAY_NAME_COLUMN,
+    DAY_ORDINAL_COLUMN
+)
+from .constraints import validate_shift_times
+from .dates import parse_dates, normalize_request_dates, get_sorted_dates
+from .formats import detect_format, iter_table_chunks, read_table
+from .timing import SpanTotal, span
+
+if TYPE_CHECKING:
+    from .engine import CandidateIndex
+
+logger = logging.getLogger(__name__)
+
+MAX_REPORTED_ROWS = 20
+# שורות בכל מקטע בקריאת קובץ הבקשות - הזיכרון בשיא הוא מקטע גולמי אחד והייצוג המצומצם
+REQUEST_CHUNK_ROWS = 100_000
+# עמודות הבקשות שנשמרות כקטגוריות (קוד שלם לכל שורה + טבלת ערכים אחת)
+CATEGORY_COLUMNS = ['שם', 'תאריך מבוקש', 'תחנה', 'משמרת', DAY_NAME_COLUMN]
+# עמודות שנקראות תמיד כטקסט, כדי שתחנה ומשמרת בבקשות יתאימו לתבנית
+REQUEST_TEXT_COLUMNS = ['שם', 'תאריך מבוקש', 'תחנה', 'משמרת']
+SHIFT_TEXT_COLUMNS = ['תחנה', 'משמרת']
+# date(1970, 1, 1).toordinal() - ההפרש בין ימי epoch למספר היום של Python
+EPOCH_ORDINAL = 719163
+# ברירת מחדל של compact_requests: חיפוש עמודת האט"ן בטבלה עצמה
+_FIND_ATAN = object()
+
+def missing_columns(req_columns, shi_columns) -> List[str]:
+    """שגיאות על עמודות חובה חסרות בשני הקבצים"""
+    errors = []
+    missing_req = set(REQUIRED_REQUEST_COLUMNS) - set(req_columns)
+    missing_shi = set(REQUIRED_SHIFT_COLUMNS) - set(shi_columns)
+    
+    if missing_req:
+        errors.append(f"❌ עמודות חסרות בקובץ בקשות: {', '.join(missing_req)}")
+    if missing_shi:
+        errors.append(f"❌ עמודות חסרות בתבנית משמרות: {', '.join(missing_shi)}")
+    return errors
+
+def find_bad_dates(req_df: pd.DataFrame, first_line: int = 2) -> List[str]:
+    """השורות עם תאריך לא תקין, "שורה (ערך)" - כפי שהן ממוספרות בקובץ"""
+    if DAY_ORDINAL_COLUMN in req_df.columns:
+        bad = (req_df[DAY_ORDINAL_COLUMN] < 0).to_numpy()
+    else:
+        parsed = req_df[DATE_COLUMN] if DATE_COLUMN in req_df.columns else parse_dates(req_df['תאריך מבוקש'])
+        bad = parsed.isna().to_numpy()
+    if not bad.any():
+        return []
+    return [
+        f"{pos + first_line} ({value})"
+        for pos, value in zip(np.flatnonzero(bad), req_df['תאריך מבוקש'].to_numpy()[bad])
+    ]
+
+def date_error(lines: List[str]) -> str:
+    shown = ', '.join(lines[:MAX_REPORTED_ROWS])
+    more = f" ועוד {len(lines) - MAX_REPORTED_ROWS}" if len(lines) > MAX_REPORTED_ROWS else ""
+    return f"❌ פורמט תאריך לא תקין ב-{len(lines)} שורות: {shown}{more}"
+
+def validate_dataframes(req_df: pd.DataFrame, shi_df: pd.DataFrame) -> List[str]:
+    """ולידציה של DataFrame - בדיקת עמודות נדרשות ותאריכים"""
+    errors = missing_columns(req_df.columns, shi_df.columns)
+    
+    # בדיקת תאריכים - כל השורות השגויות מדווחות יחד (שורה 1 בקובץ היא הכותרת)
+    if 'תאריך מבוקש' in req_df.columns:
+        lines = find_bad_dates(req_df)
+        if lines:
+            errors.append(date_error(lines))
+    
+    errors.extend(validate_shift_times(shi_df))
+    return errors
+
+def get_atan_column(df: pd.DataFrame) -> Optional[str]:
+    """חיפוש בטוח של עמודת אישור אט"ן"""
+    atan_cols = [c for c in df.columns if "אט" in c and "מורשה" in c]
+    if not atan_cols:
+        logger.warning("Atan column not found")
+        return None
+    return atan_cols[0]
+
+def compact_requests(req_df: pd.DataFrame, atan_col=_FIND_ATAN) -> pd.DataFrame:
+    """ייצוג עמודתי חסכוני לקובץ הבקשות: שם/תאריך/תחנה/משמרת כקטגוריות,
+    מספר יום שלם במקום התאריך המפוענח ועמודת אט"ן בוליאנית.
+    atan_col - שם עמודת האט"ן (או None אם אין), כשהוא כבר ידוע מכותרת הקובץ"""
+    req_df = req_df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in req_df.columns:
+            req_df[col] = req_df[col].astype('category')
+    
+    if DATE_COLUMN in req_df.columns:
+        parsed = req_df.pop(DATE_COLUMN)
+        days = parsed.to_numpy(dtype='datetime64[D]').astype(np.int64) + EPOCH_ORDINAL
+        req_df[DAY_ORDINAL_COLUMN] = np.where(parsed.isna().to_numpy(), -1, days).astype(np.int32)
+    
+    if atan_col is _FIND_ATAN:
+        atan_col = get_atan_column(req_df)
+    if atan_col and not pd.api.types.is_bool_dtype(req_df[atan_col]):
+        req_df[atan_col] = (req_df[atan_col] == 'כן').to_numpy()
+    return req_df
+
+class UploadData(NamedTuple):
+    """קבצי הקלט לאחר פענוח, ולידציה ובניית אינדקס - לקריאה בלבד"""
+    req_df: pd.DataFrame
+    shi_df: pd.DataFrame
+    errors: List[str]
+    dates: List[str]
+    day_names: Dict[str, str]
+    index: Optional['CandidateIndex']
+
+def is_request_column(column: str) -> bool:
+    """עמודות שנקראות מקובץ הבקשות - כל השאר נזרקות כבר בזמן הקריאה"""
+    return column in REQUIRED_REQUEST_COLUMNS or ("אט" in column and "מורשה" in column)
+
+def concat_requests(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """איחוד מקטעים מצומצמים - עמודות קטגוריאליות מאוחדות בלי לחזור למחרוזות"""
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+    columns = {}
+    for col in chunks[0].columns:
+        parts = [chunk[col] for chunk in chunks]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            try:
+                columns[col] = union_categoricals(parts)
+            except TypeError:
+                # סוג הערכים הוסק אחרת במקטעים שונים (למשל תחנה מספרית וטקסטואלית)
+                columns[col] = pd.Categorical(pd.concat(parts, ignore_index=True).astype(object))
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+def load_tables(req_source, shi_source, chunk_rows: int = REQUEST_CHUNK_ROWS) -> UploadData:
+    """קריאה, פענוח, ולידציה ואינדוקס של קבצי הקלט (נתיב או אובייקט קובץ;
+    CSV, Excel, Parquet או Arrow - לפי סיומת השם).
+    
+    קובץ הבקשות נקרא במקטעים של chunk_rows שורות: כל מקטע נבדק ומצומצם לפני
+    קריאת הבא, כך שבשיא נמצאים בזיכרון מקטע גולמי אחד והייצוג המצומצם.
+    שגיאה במקטע עוצרת את הקריאה - אין טעם לקרוא את שאר הקובץ.
+    """
+    from .engine import CandidateIndex
+    chunks: List[pd.DataFrame] = []
+    # הבדיקה והצמצום נעשים לכל מקטע בתוך הקריאה; כל אחד נרשם פעם אחת עם סכום הזמנים
+    validate = SpanTotal('validate')
+    compact = SpanTotal('compact')
+    with span('csv_parse', format=detect_format(req_source)) as fields:
+        shi_df = read_table(shi_source, text_columns=SHIFT_TEXT_COLUMNS)
+        with validate.part():
+            errors = validate_shift_times(shi_df)
+        # עמודות הטקסט נקראות ישירות כקטגוריה: סוג שמוסק מכל מקטע בנפרד היה הופך
+        # תחנה 1 למספר במקטע אחד ולטקסט באחר, והיא לא הייתה מתאימה לתבנית
+        reader = iter_table_chunks(req_source, chunk_rows, columns=is_request_column,
+                                   category_columns=REQUEST_TEXT_COLUMNS)
+        rows = 0
+        with closing(reader):
+            for chunk in reader:
+                if rows == 0:
+                    # כותרת הקובץ נבדקת כבר במקטע הראשון, ועמודת האט"ן נמצאת פעם אחת
+                    with validate.part():
+                        errors = missing_columns(chunk.columns, shi_df.columns) + errors
+                    if errors:
+                        break
+                    atan_col = get_atan_column(chunk)
+                
+                # פענוח תאריכים ושמות ימים במעבר וקטורי אחד
+                chunk = normalize_request_dates(chunk)
+                with validate.part():
+                    lines = find_bad_dates(chunk, first_line=rows + 2)
+                rows += len(chunk)
+                if lines:
+                    errors.insert(0, date_error(lines))
+                    if len(chunk) == chunk_rows:
+                        errors.insert(1, f"⚠️ הבדיקה נעצרה בשורה {rows + 1} - ייתכנו שגיאות נוספות בהמשך הקובץ")
+                    break
+                
+                with compact.part():
+                    chunks.append(compact_requests(chunk, atan_col))
+        fields.update(rows=rows, chunks=len(chunks))
+    validate.record(errors=len(errors))
+    
+    if errors:
+        req_df = concat_requests(chunks) if chunks else pd.DataFrame(columns=REQUIRED_REQUEST_COLUMNS)
+        return UploadData(req_df, shi_df, errors, [], {}, None)
+    
+    with compact.part():
+        req_df = concat_requests(chunks)
+    compact.record(bytes=int(req_df.memory_usage(deep=True).sum()))
+    dates, day_names = get_sorted_dates(req_df)
+    logger.info(f"Parsed input: {len(req_df)} requests, {len(dates)} dates ({len(chunks)} chunks)")
+    # האינדקס נבנה פעם אחת מהקודים המצומצמים - איחוד אינדקסים חלקיים יקר יותר,
+    # כי כל מקטע נוגע כמעט בכל המשמרות
+    with span('candidate_index'):
+        index = CandidateIndex(req_df)
+    return UploadData(req_df, shi_df, errors, dates, day_names, index)
@@ -0,0 +1,73 @@
+"""פענוח תאריכים ושמות ימים"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .constants import DATE_FORMATS, DAYS_HEB, DATE_COLUMN, DAY_NAME_COLUMN, DAY_ORDINAL_COLUMN
+
+logger = logging.getLogger(__name__)
+
+# שמות הימים לפי date.weekday() (0 = שני), ואחריהם "" לתאריך חסר
+WEEKDAY_NAMES_HEB = np.array(
+    [DAYS_HEB[name] for name in
+     ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')] + [""],
+    dtype=object
+)
+
+def parse_date_safe(date_str: str) -> datetime:
+    """המרה בטוחה של תאריך עם תמיכה במספר פורמטים"""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(date_str).strip(), fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"פורמט תאריך לא תקין: {date_str}")
+
+def get_day_name(date_str: str) -> str:
+    """המרת תאריך לשם יום בעברית"""
+    try:
+        dt = parse_date_safe(date_str)
+        return DAYS_HEB.get(dt.strftime('%A'), "")
+    except ValueError:
+        logger.warning(f"Invalid date format: {date_str}")
+        return ""
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """המרה וקטורית של עמודת תאריכים - כל פורמט נבדק פעם אחת על הערכים שטרם זוהו"""
+    # כל ערך ייחודי מפוענח פעם אחת בלבד
+    codes, uniques = pd.factorize(values.astype(str).str.strip())
+    uniques = pd.Series(uniques)
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
+    for fmt in DATE_FORMATS:
+        pending = parsed.isna()
+        if not pending.any():
+            break
+        parsed[pending] = pd.to_datetime(uniques[pending], format=fmt, errors='coerce')
+    
+    # קוד 1- (ערך חסר) נופל על ה-NaT שבסוף - גם כשאין אף ערך ייחודי
+    result = np.append(parsed.to_numpy(), np.datetime64('NaT'))[codes]
+    return pd.Series(result, index=values.index)
+
+def normalize_request_dates(req_df: pd.DataFrame) -> pd.DataFrame:
+    """הוספת עמודת תאריך מפוענח ועמודת שם יום בעברית לקובץ הבקשות"""
+    req_df = req_df.copy()
+    req_df[DATE_COLUMN] = parse_dates(req_df['תאריך מבוקש'])
+    # שם היום לפי מספר היום בשבוע (0 = שני) - בלי לייצר שם אנגלי לכל שורה
+    weekday = req_df[DATE_COLUMN].dt.dayofweek.fillna(7).astype(np.int64).to_numpy()
+    req_df[DAY_NAME_COLUMN] = WEEKDAY_NAMES_HEB[weekday]
+    return req_df
+
+def get_sorted_dates(req_df: pd.DataFrame) -> Tuple[List[str], Dict[str, str]]:
+    """רשימת התאריכים ממוינת כרונולוגית, ומיפוי תאריך -> שם יום"""
+    sort_column = DAY_ORDINAL_COLUMN if DAY_ORDINAL_COLUMN in req_df.columns else DATE_COLUMN
+    unique_dates = (
+        req_df.drop_duplicates('תאריך מבוקש')
+        .sort_values(sort_column, kind='stable')
+    )
+    dates = unique_dates['תאריך מבוקש'].tolist()
+    day_names = dict(zip(dates, unique_dates[DAY_NAME_COLUMN]))
+    return dates, day_names
@@ -0,0 +1,129 @@
+"""טיוטות שיבוץ בצד השרת - שמירת מצב הלוח ב-SQLite מקומי ושחזור מיידי.
+
+טיוטה מזוהה לפי יחידה וטביעת האצבע של קבצי הקלט, כך שרענון דפדפן או הפעלה
+מחדש של השרת לא מאבדים עבודה: השיבוץ משוחזר כמו שהוא, בלי להריץ שיבוץ מחדש.
+המצב נשמר כ-JSON דחוס - רשומה אחת קטנה לכל טיוטה.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, NamedTuple, Optional, Set
+
+from .slots import SlotKey
+from .timing import timed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DRAFTS_PATH = "shibutz_drafts.db"
+DEFAULT_UNIT = "default"
+# טיוטות שלא עודכנו זמן רב נמחקות בפתיחת המאגר
+DRAFT_MAX_AGE_DAYS = 30
+# דחיסה מהירה - הטיוטה נכתבת בכל שינוי, והטקסט חוזר על עצמו ממילא
+DRAFT_COMPRESS_LEVEL = 1
+
+class Draft(NamedTuple):
+    """מצב הלוח השמור: שיבוצים, ביטולים, שיבוצים ידניים ותאריכים שנערכו"""
+    schedule: Dict[SlotKey, str]
+    cancelled: Set[SlotKey]
+    manual_slots: Set[SlotKey]
+    dirty_dates: Set[str]
+    saved_at: str = ""
+
+def draft_key(unit: str, *digests: str) -> str:
+    """מפתח הטיוטה: היחידה וטביעות האצבע של קבצי הקלט (מספרי השורות בתבנית תלויים בהם)"""
+    upload = hashlib.sha256('/'.join(digests).encode()).hexdigest()[:32]
+    return f"{unit}:{upload}"
+
+def draft_fingerprint(schedule: Dict[SlotKey, str], cancelled: Iterable[SlotKey],
+                      manual_slots: Iterable[SlotKey], dirty_dates: Iterable[str]) -> int:
+    """טביעת אצבע זולה של המצב - להשוואה בתוך אותו תהליך בלבד (hash של Python משתנה בין הרצות)"""
+    return hash((
+        frozenset(schedule.items()), frozenset(cancelled),
+        frozenset(manual_slots), frozenset(dirty_dates)
+    ))
+
+def encode_draft(draft: Draft) -> bytes:
+    """JSON דחוס; משמרת נשמרת כרשימה [תאריך, תחנה, משמרת, שורה]"""
+    payload = {
+        'schedule': [[*slot, name] for slot, name in draft.schedule.items()],
+        'cancelled': [list(slot) for slot in draft.cancelled],
+        'manual': [list(slot) for slot in draft.manual_slots],
+        'dirty': sorted(draft.dirty_dates)
+    }
+    # תחנה מספרית בתבנית מגיעה כסקלר של numpy
+    text = json.dumps(payload, ensure_ascii=False, separators=(',', ':'),
+                      default=lambda value: value.item())
+    return zlib.compress(text.encode('utf-8'), DRAFT_COMPRESS_LEVEL)
+
+def decode_draft(data: bytes, saved_at: str = "") -> Draft:
+    payload = json.loads(zlib.decompress(data).decode('utf-8'))
+    return Draft(
+        {SlotKey(*item[:4]): item[4] for item in payload['schedule']},
+        {SlotKey(*item) for item in payload['cancelled']},
+        {SlotKey(*item) for item in payload['manual']},
+        set(payload['dirty']),
+        saved_at
+    )
+
+class DraftInfo(NamedTuple):
+    """פרטי טיוטה להצגה - בלי לפענח אותה"""
+    assigned: int
+    saved_at: str
+
+class DraftStore:
+    """מאגר טיוטות ב-SQLite (מצב WAL) - רשומה אחת לכל מפתח, נדרסת בכל שמירה"""
+
+    def __init__(self, path: str = DEFAULT_DRAFTS_PATH, max_age_days: int = DRAFT_MAX_AGE_DAYS):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS drafts ("
+                "key TEXT PRIMARY KEY, state BLOB NOT NULL, assigned INTEGER NOT NULL, "
+                "saved_at TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            pruned = self._conn.execute(
+                "DELETE FROM drafts WHERE updated < ?", (time.time() - max_age_days * 86400,)
+            ).rowcount
+        if pruned:
+            logger.info(f"Pruned {pruned} drafts older than {max_age_days} days")
+
+    @timed('draft_save')
+    def save(self, key: str, draft: Draft) -> None:
+        data = encode_draft(draft)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO drafts (key, state, assigned, saved_at, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state = excluded.state, assigned = excluded.assigned, "
+                "saved_at = excluded.saved_at, updated = excluded.updated",
+                (key, data, len(draft.schedule), datetime.now().strftime('%d/%m/%Y %H:%M'), time.time())
+            )
+        logger.info(f"Draft {key} saved: {len(draft.schedule)} assignments, {len(data)} bytes")
+
+    def info(self, key: str) -> Optional[DraftInfo]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT assigned, saved_at FROM drafts WHERE key = ?", (key,)
+            ).fetchone()
+        return DraftInfo(*row) if row else None
+
+    @timed('draft_load')
+    def load(self, key: str) -> Optional[Draft]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, saved_at FROM drafts WHERE key = ?", (key,)
+            ).fetchone()
+        return decode_draft(*row) if row else None
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM drafts WHERE key = ?", (key,))
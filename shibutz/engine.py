@@ -0,0 +1,380 @@
+"""אלגוריתמי השיבוץ: אינדקס מועמדים, שיבוץ חמדני ושיבוץ אופטימלי"""
+
+import heapq
+import logging
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .data import get_atan_column
+from .constraints import ShiftConstraints
+from .slots import SlotKey
+from .storage import schedule_delta
+from .timing import timed
+
+logger = logging.getLogger(__name__)
+
+ENGINE_GREEDY = "greedy"
+ENGINE_OPTIMAL = "optimal"
+ENGINE_PARALLEL = "parallel"
+ENGINE_LABELS = {
+    ENGINE_GREEDY: "⚡ מהיר (לפי סדר)",
+    ENGINE_OPTIMAL: "🎯 אופטימלי (מינימום חוסרים)",
+    ENGINE_PARALLEL: "🚀 מקבילי (אופק ארוך, לפי שבועות)"
+}
+
+def column_codes(column: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """קודים שלמים לכל שורה ומערך הערכים שלהם (-1 לערך חסר); עמודה קטגוריאלית - ללא חישוב"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), np.asarray(column.cat.categories, dtype=object)
+    codes, uniques = pd.factorize(column)
+    return codes, np.asarray(uniques, dtype=object)
+
+def group_positions(codes: np.ndarray):
+    """(קוד, מיקומי השורות) לכל קבוצה, לפי סדר הופעת השורות; קוד שלילי - מדולג"""
+    if not len(codes):
+        return
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    bounds = np.flatnonzero(np.diff(sorted_codes)) + 1
+    starts = np.concatenate(([0], bounds)).tolist()
+    ends = np.concatenate((bounds, [len(codes)])).tolist()
+    for start, end, code in zip(starts, ends, sorted_codes[starts].tolist()):
+        if code >= 0:
+            yield code, order[start:end]
+
+class CandidateIndex:
+    """אינדקס מועמדים לפי (תאריך, תחנה, משמרת) - נבנה פעם אחת לכל העלאה"""
+
+    def __init__(self, req_df: pd.DataFrame):
+        atan_col = get_atan_column(req_df)
+        self.has_atan = atan_col is not None
+
+        # שם לכל שורה מתוך טבלת הערכים (קוד -1, שם חסר, נופל על ה-NaN שבסוף)
+        name_codes, name_values = column_codes(req_df['שם'])
+        names = np.append(name_values, np.nan)[name_codes]
+        if atan_col is None:
+            atan_mask = np.zeros(len(req_df), dtype=bool)
+        elif pd.api.types.is_bool_dtype(req_df[atan_col]):
+            atan_mask = req_df[atan_col].to_numpy()
+        else:
+            atan_mask = (req_df[atan_col] == 'כן').to_numpy()
+
+        # הקיבוץ נעשה על קודים שלמים (מעמודות קטגוריאליות) ולא על השוואת מחרוזות
+        date_codes, date_values = column_codes(req_df['תאריך מבוקש'])
+        station_codes, station_values = column_codes(req_df['תחנה'])
+        shift_codes, shift_values = column_codes(req_df['משמרת'])
+        n_stations, n_shifts = len(station_values), len(shift_values)
+        slot_codes = (date_codes.astype(np.int64) * n_stations + station_codes) * n_shifts + shift_codes
+        slot_codes[(date_codes < 0) | (station_codes < 0) | (shift_codes < 0)] = -1
+
+        # מיקומי השורות בכל קבוצה נשמרים לפי סדר הופעתן בקובץ
+        self._slots: Dict[Tuple, Tuple[np.ndarray, np.ndarray]] = {}
+        for code, pos in group_positions(slot_codes):
+            date_code, rest = divmod(code, n_stations * n_shifts)
+            station_code, shift_code = divmod(rest, n_shifts)
+            key = (date_values[date_code], station_values[station_code], shift_values[shift_code])
+            self._slots[key] = (names[pos], atan_mask[pos])
+        
+        # מועמדים לפי תאריך בלבד (לדיאלוג השיבוץ הידני) - כל עובד פעם אחת,
+        # מורשה אט"ן אם אחת מבקשותיו לאותו יום מסומנת כמורשה
+        pair_base = np.int64(len(name_values) + 1)
+        pairs = date_codes.astype(np.int64) * pair_base + (name_codes + 1)
+        pairs[date_codes < 0] = -1
+        unique_pairs, first, inverse = np.unique(pairs, return_index=True, return_inverse=True)
+        authorized = np.bincount(inverse.ravel(), weights=atan_mask, minlength=len(unique_pairs)) > 0
+        pair_dates = np.where(unique_pairs >= 0, unique_pairs // pair_base, -1)
+        # בתוך כל תאריך - לפי ההופעה הראשונה של העובד בקובץ
+        by_appearance = np.argsort(first, kind='stable')
+        self._dates: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for date_code, pos in group_positions(pair_dates[by_appearance]):
+            pos = by_appearance[pos]
+            self._dates[date_values[date_code]] = (names[first[pos]], authorized[pos])
+        logger.info(f"Candidate index built: {len(self._slots)} slots, {len(req_df)} requests")
+
+    def candidates(self, date_str: str, station, shift, atan_only: bool = False) -> np.ndarray:
+        """מועמדים שביקשו את המשמרת, לפי סדר הופעתם בקובץ"""
+        entry = self._slots.get((date_str, station, shift))
+        if entry is None:
+            return np.empty(0, dtype=object)
+        names, atan_mask = entry
+        if atan_only and self.has_atan:
+            return names[atan_mask]
+        return names
+
+    def date_candidates(self, date_str: str, atan_only: bool = False) -> np.ndarray:
+        """כל העובדים שביקשו לעבוד בתאריך (ללא כפילויות), לפי סדר הופעתם בקובץ"""
+        entry = self._dates.get(date_str)
+        if entry is None:
+            return np.empty(0, dtype=object)
+        names, atan_mask = entry
+        if atan_only and self.has_atan:
+            return names[atan_mask]
+        return names
+
+class SlotHeap:
+    """ערימה עצלה של מועמדים למשמרת, ממוינת לפי (מאזן, סדר בקובץ)"""
+    __slots__ = ('_heap',)
+
+    def __init__(self, names, running_balance: Dict[str, int]):
+        # עובד שמופיע כמה פעמים נכנס פעם אחת, לפי הופעתו הראשונה
+        self._heap = [
+            (running_balance.get(name, 0), order, name)
+            for order, name in enumerate(dict.fromkeys(names))
+        ]
+        heapq.heapify(self._heap)
+
+    def pop_best(self, running_balance: Dict[str, int],
+                 is_free: Callable[[str], bool]) -> Optional[str]:
+        """שליפת העובד הפנוי עם המאזן הנמוך ביותר, או None אם אין.
+        עובד שאינו פנוי נזרק מהערימה - שיבוצים רק מתווספים, כך שלא יתפנה בהמשך"""
+        heap = self._heap
+        while heap:
+            score, order, name = heap[0]
+            if not is_free(name):
+                heapq.heappop(heap)
+                continue
+            current = running_balance.get(name, 0)
+            if current != score:
+                # המאזן עלה מאז ההכנסה - מעדכנים את הרשומה במקום למיין מחדש
+                heapq.heapreplace(heap, (current, order, name))
+                continue
+            heapq.heappop(heap)
+            return name
+        return None
+
+def get_shift_rows(shi_df: pd.DataFrame) -> List[Tuple]:
+    """שורות התבנית כרשומות (מספר שורה, תחנה, משמרת, האם אט"ן)"""
+    return list(zip(
+        shi_df.index.astype(int),
+        shi_df['תחנה'],
+        shi_df['משמרת'],
+        shi_df['סוג תקן'].astype(str).str.contains('אט', regex=False)
+    ))
+
+def _fill_date(date_str: str, shift_rows: List[Tuple], index: CandidateIndex,
+               running_balance: Dict[str, int], constraints: ShiftConstraints,
+               cancelled: Set[SlotKey], filled: Dict[SlotKey, str], taken: Set[str],
+               out: Dict[SlotKey, str]) -> Tuple[int, int]:
+    """שיבוץ חמדני של המשמרות הפנויות ביום אחד; משמרות שב-filled נשארות כמו שהן"""
+    assigned_count = 0
+    missing_count = 0
+    # ערימה אחת לכל (תחנה, משמרת, אט"ן, שעות) ביום - משותפת לשורות זהות בתבנית
+    heaps: Dict[Tuple, SlotHeap] = {}
+    for idx, station, shift, is_atan in shift_rows:
+        shift_key = SlotKey(date_str, station, shift, idx)
+        
+        # דלג על משמרות מבוטלות ועל משמרות שכבר מאוישות
+        if shift_key in cancelled or shift_key in filled:
+            continue
+        
+        heap_key = (station, shift, is_atan, constraints.shift_times(idx))
+        heap = heaps.get(heap_key)
+        if heap is None:
+            # מועמדים מהאינדקס (כולל סינון אט"ן אם נדרש)
+            heap = SlotHeap(
+                index.candidates(date_str, station, shift, atan_only=is_atan),
+                running_balance
+            )
+            heaps[heap_key] = heap
+        
+        # בחירת מי שעבד הכי פחות ועומד בכללים (בשוויון - הראשון בקובץ)
+        best_employee = heap.pop_best(
+            running_balance,
+            lambda name: constraints.can_assign(name, date_str, idx)
+        )
+        
+        if best_employee is not None:
+            out[shift_key] = best_employee
+            taken.add(best_employee)
+            constraints.add(best_employee, date_str, idx)
+            running_balance[best_employee] = running_balance.get(best_employee, 0) + 1
+            assigned_count += 1
+        else:
+            missing_count += 1
+    return assigned_count, missing_count
+
+@timed('auto_assign', engine=ENGINE_GREEDY)
+def auto_assign(dates: List[str], shi_df: pd.DataFrame, 
+                req_df: pd.DataFrame, balance: Dict[str, int],
+                index: Optional[CandidateIndex] = None,
+                cancelled: Optional[Set[SlotKey]] = None,
+                constraints: Optional[ShiftConstraints] = None) -> Tuple[Dict, Dict]:
+    """שיבוץ אוטומטי של כל המשמרות (constraints מתמלא בשיבוצים שבוצעו)"""
+    temp_schedule = {}
+    cancelled = cancelled or set()
+    temp_assigned_today = {d: set() for d in dates}
+    running_balance = balance.copy()
+    
+    if index is None:
+        index = CandidateIndex(req_df)
+    if constraints is None:
+        constraints = ShiftConstraints(shi_df)
+    
+    # שורות התבנית מחושבות פעם אחת ולא בכל תאריך מחדש
+    shift_rows = get_shift_rows(shi_df)
+    
+    assigned_count = 0
+    missing_count = 0
+    
+    for date_str in dates:
+        assigned, missing = _fill_date(
+            date_str, shift_rows, index, running_balance, constraints, cancelled,
+            temp_schedule, temp_assigned_today[date_str], temp_schedule
+        )
+        assigned_count += assigned
+        missing_count += missing
+    
+    logger.info(f"Auto-assignment: {assigned_count} assigned, {missing_count} missing")
+    return temp_schedule, temp_assigned_today
+
+@timed('fill_holes')
+def fill_holes(dates: List[str], shi_df: pd.DataFrame, req_df: pd.DataFrame,
+               balance: Dict[str, int], schedule: Dict[SlotKey, str],
+               index: Optional[CandidateIndex] = None,
+               cancelled: Optional[Set[SlotKey]] = None,
+               constraints: Optional[ShiftConstraints] = None,
+               committed: Optional[Dict[str, str]] = None) -> Dict[SlotKey, str]:
+    """השלמת המשמרות הריקות בתאריכים הנתונים בלי לגעת בשיבוצים הקיימים.
+    
+    מחזיר רק את השיבוצים החדשים. constraints צריך לשקף את schedule (אם לא הועבר - נבנה ממנו)
+    ומתעדכן בשיבוצים החדשים. committed - השיבוץ השמור (מזהה מסמך -> עובד), שכבר כלול
+    ב-balance: רק ההבדל בינו לבין schedule נוסף למאזן, כך שהחלוקה נשארת הוגנת.
+    """
+    cancelled = cancelled or set()
+    if index is None:
+        index = CandidateIndex(req_df)
+    if constraints is None:
+        constraints = ShiftConstraints.from_schedule(shi_df, schedule)
+    
+    running_balance = balance.copy()
+    for name, count in schedule_delta(schedule, committed or {}).counts.items():
+        running_balance[name] = running_balance.get(name, 0) + count
+    
+    shift_rows = get_shift_rows(shi_df)
+    added: Dict[SlotKey, str] = {}
+    assigned_count = 0
+    missing_count = 0
+    for date_str in dates:
+        assigned, missing = _fill_date(
+            date_str, shift_rows, index, running_balance, constraints, cancelled,
+            schedule, set(), added
+        )
+        assigned_count += assigned
+        missing_count += missing
+    
+    logger.info(f"Fill holes on {len(dates)} dates: {assigned_count} assigned, {missing_count} missing")
+    return added
+
+def _assign_round(open_slots: List[Tuple[SlotKey, bool]], index: CandidateIndex,
+                  constraints: ShiftConstraints, running_balance: Dict[str, int],
+                  linear_sum_assignment: Callable) -> Dict[SlotKey, str]:
+    """סבב השמה אחד של יום: לכל עובד משמרת אחת לכל היותר מבין המשמרות הפתוחות"""
+    # בניית גרף דו-צדדי: משמרות פתוחות x עובדים שביקשו אותן
+    edge_rows, edge_cols = [], []
+    employees: Dict[str, int] = {}
+    for row, (shift_key, is_atan) in enumerate(open_slots):
+        candidates = index.candidates(shift_key.date, shift_key.station, shift_key.shift, atan_only=is_atan)
+        for name in dict.fromkeys(candidates):
+            if not constraints.can_assign(name, shift_key.date, shift_key.row):
+                continue
+            edge_rows.append(row)
+            edge_cols.append(employees.setdefault(name, len(employees)))
+    
+    if not edge_rows:
+        return {}
+    
+    names = list(employees)
+    n_slots, n_emps = len(open_slots), len(names)
+    k = min(n_slots, n_emps)
+    
+    # עלות שולית של משמרת נוספת לסכום ריבועי המאזנים: (b+1)^2 - b^2 = 2b+1.
+    # סדר ההופעה בקובץ שובר שוויון, בקנה מידה שלא יכול לגבור על יחידת מאזן אחת.
+    bal = np.fromiter((running_balance.get(n, 0) for n in names), dtype=np.int64, count=n_emps)
+    scale = n_emps * k + 1
+    edge_cols_arr = np.asarray(edge_cols)
+    edge_cost = (2 * bal[edge_cols_arr] + 1) * scale + edge_cols_arr
+    
+    # משמרת לא מאוישת עולה יותר מכל הצבה חוקית - כך ממוזער קודם מספר החוסרים
+    unfilled = int(edge_cost.max()) * k + 1
+    cost = np.full((n_slots, n_emps), unfilled, dtype=np.int64)
+    cost[np.asarray(edge_rows), edge_cols_arr] = edge_cost
+    
+    rows, cols = linear_sum_assignment(cost)
+    filled = cost[rows, cols] < unfilled
+    return {open_slots[row][0]: names[col] for row, col in zip(rows[filled], cols[filled])}
+
+@timed('auto_assign', engine=ENGINE_OPTIMAL)
+def auto_assign_optimal(dates: List[str], shi_df: pd.DataFrame,
+                        req_df: pd.DataFrame, balance: Dict[str, int],
+                        index: Optional[CandidateIndex] = None,
+                        cancelled: Optional[Set[SlotKey]] = None,
+                        constraints: Optional[ShiftConstraints] = None) -> Tuple[Dict, Dict]:
+    """שיבוץ אופטימלי - השמה מינימלית לכל יום (מינימום חוסרים, ואז איזון מאזן).
+    
+    כל סבב השמה נותן לכל עובד משמרת אחת לכל היותר. כש-max_per_day גדול מ-1 היום
+    נפתר בעד max_per_day סבבים על המשמרות שנותרו פתוחות; כל סבב נבדק מול constraints
+    אחרי הסבבים הקודמים, כך שמשמרות חופפות או בלי מנוחה מספקת לא משובצות לאותו עובד.
+    """
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        logger.warning("scipy not installed, falling back to greedy auto-assignment")
+        return auto_assign(dates, shi_df, req_df, balance, index=index, cancelled=cancelled,
+                           constraints=constraints)
+    
+    temp_schedule = {}
+    cancelled = cancelled or set()
+    temp_assigned_today = {d: set() for d in dates}
+    running_balance = balance.copy()
+    
+    if index is None:
+        index = CandidateIndex(req_df)
+    if constraints is None:
+        constraints = ShiftConstraints(shi_df)
+    shift_rows = get_shift_rows(shi_df)
+    
+    assigned_count = 0
+    missing_count = 0
+    
+    for date_str in dates:
+        open_slots = []
+        for idx, station, shift, is_atan in shift_rows:
+            shift_key = SlotKey(date_str, station, shift, idx)
+            if shift_key not in cancelled:
+                open_slots.append((shift_key, is_atan))
+        for _ in range(constraints.rules.max_per_day):
+            filled = _assign_round(open_slots, index, constraints, running_balance, linear_sum_assignment)
+            if not filled:
+                break
+            for shift_key, name in filled.items():
+                temp_schedule[shift_key] = name
+                temp_assigned_today[date_str].add(name)
+                constraints.add(name, date_str, shift_key.row)
+                running_balance[name] = running_balance.get(name, 0) + 1
+            assigned_count += len(filled)
+            open_slots = [(shift_key, is_atan) for shift_key, is_atan in open_slots
+                          if shift_key not in filled]
+        missing_count += len(open_slots)
+    
+    logger.info(f"Optimal auto-assignment: {assigned_count} assigned, {missing_count} missing")
+    return temp_schedule, temp_assigned_today
+
+# מנועי השיבוץ לפי שם (כפי שנבחרים בסרגל הצד או בשורת הפקודה); המקבילי נרשם ב-parallel.py
+ENGINES: Dict[str, Callable] = {
+    ENGINE_GREEDY: auto_assign,
+    ENGINE_OPTIMAL: auto_assign_optimal
+}
+
+def schedule_metrics(shi_df: pd.DataFrame, dates: List[str], schedule: Dict[SlotKey, str],
+                     cancelled: Optional[Set[SlotKey]] = None) -> Dict[str, float]:
+    """מדדי סיכום: סך משמרות, משובצות, חסרות ואחוז השלמה"""
+    total = len(shi_df) * len(dates) - len(cancelled or ())
+    assigned = len(schedule)
+    return {
+        'total': total,
+        'assigned': assigned,
+        'missing': total - assigned,
+        'completion': (assigned / total * 100) if total > 0 else 0.0
+    }
@@ -0,0 +1,195 @@
+"""פורמטי קבצים לקלט ולפלט: CSV, Parquet, Arrow (Feather) ו-Excel
+
+הפורמט נקבע לפי סיומת שם הקובץ (נתיב, או השדה name של אובייקט קובץ); בלי סיומת
+מוכרת - CSV, כמו תמיד. Parquet ו-Arrow נקראים במיפוי זיכרון כשהמקור הוא נתיב,
+כך שטעינה חוזרת של אותו קובץ חודשי לא מעתיקה אותו ולא מפענחת טקסט עברי מחדש.
+"""
+
+import io
+import os
+from datetime import date
+from typing import Callable, Iterator, Optional, Sequence
+
+import pandas as pd
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+FORMAT_ARROW = "arrow"
+FORMAT_XLSX = "xlsx"
+TABLE_FORMATS = (FORMAT_CSV, FORMAT_XLSX, FORMAT_PARQUET, FORMAT_ARROW)
+FORMAT_LABELS = {
+    FORMAT_CSV: "CSV",
+    FORMAT_XLSX: "Excel (xlsx)",
+    FORMAT_PARQUET: "Parquet",
+    FORMAT_ARROW: "Arrow / Feather"
+}
+# סיומות לכל פורמט; הראשונה משמשת לשמות קבצי פלט
+FORMAT_EXTENSIONS = {
+    FORMAT_CSV: ('csv',),
+    FORMAT_XLSX: ('xlsx',),
+    FORMAT_PARQUET: ('parquet', 'pq'),
+    FORMAT_ARROW: ('arrow', 'feather', 'ipc')
+}
+FORMAT_MIME = {
+    FORMAT_CSV: "text/csv",
+    FORMAT_XLSX: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    FORMAT_PARQUET: "application/vnd.apache.parquet",
+    FORMAT_ARROW: "application/vnd.apache.arrow.file"
+}
+# הסיומות שמתקבלות בהעלאת קבצים
+UPLOAD_TYPES = [ext for exts in FORMAT_EXTENSIONS.values() for ext in exts]
+
+# תאריכים שנשמרו כתאריך אמיתי (Excel, Parquet) הופכים לטקסט באותו פורמט כמו ב-CSV
+DATE_TEXT_FORMAT = '%d/%m/%Y'
+REQUEST_DATE_COLUMN = 'תאריך מבוקש'
+
+def detect_format(source) -> str:
+    """הפורמט לפי סיומת שם הקובץ; ברירת מחדל - CSV"""
+    if isinstance(source, (str, os.PathLike)):
+        name = os.fspath(source)
+    else:
+        name = getattr(source, 'name', None) or ''
+    extension = os.path.splitext(str(name))[1].lower().lstrip('.')
+    for fmt, extensions in FORMAT_EXTENSIONS.items():
+        if extension in extensions:
+            return fmt
+    return FORMAT_CSV
+
+def named_buffer(data: bytes, name: str) -> io.BytesIO:
+    """בתים בזיכרון עם שם קובץ - כדי שהפורמט יזוהה לפי הסיומת"""
+    buffer = io.BytesIO(data)
+    buffer.name = name
+    return buffer
+
+def _arrow_source(source):
+    """נתיב - מיפוי זיכרון; אובייקט קובץ - עטיפה של הבתים שכבר בזיכרון, בלי העתקה"""
+    import pyarrow as pa
+    if isinstance(source, (str, os.PathLike)):
+        return pa.memory_map(os.fspath(source))
+    data = source.getvalue() if hasattr(source, 'getvalue') else source.read()
+    return pa.BufferReader(data)
+
+def _date_text(df: pd.DataFrame) -> pd.DataFrame:
+    """עמודת התאריך המבוקש כטקסט, גם כשבקובץ היא נשמרה כתאריך"""
+    if REQUEST_DATE_COLUMN not in df.columns:
+        return df
+    values = df[REQUEST_DATE_COLUMN]
+    if pd.api.types.is_datetime64_any_dtype(values):
+        df[REQUEST_DATE_COLUMN] = values.dt.strftime(DATE_TEXT_FORMAT)
+    elif values.dtype == object:
+        df[REQUEST_DATE_COLUMN] = values.map(
+            lambda v: v.strftime(DATE_TEXT_FORMAT) if isinstance(v, date) else v
+        )
+    return df
+
+def _as_text(df: pd.DataFrame, columns: Sequence[str], category: bool = False) -> pd.DataFrame:
+    """עמודות שהן תמיד טקסט - כך שתחנה 1 נקראת '1' בכל קובץ ובכל מקטע,
+    בלי תלות בסוג שהקורא הסיק מהערכים שראה. ערכים חסרים נשארים חסרים"""
+    for col in columns:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = values.cat.categories
+            if categories.dtype == object and all(isinstance(c, str) for c in categories):
+                continue
+            text = categories.map(str)
+            if not text.has_duplicates:
+                df[col] = values.cat.rename_categories(text)
+                continue
+        values = values.astype(object)
+        values = values.where(values.isna(), values.astype(str))
+        df[col] = values.astype('category') if category else values
+    return df
+
+def _arrow_columns(schema, columns: Optional[Callable[[str], bool]]) -> list:
+    return [name for name in schema.names if columns is None or columns(name)]
+
+def read_table(source, fmt: Optional[str] = None,
+               columns: Optional[Callable[[str], bool]] = None,
+               text_columns: Sequence[str] = ()) -> pd.DataFrame:
+    """קריאת טבלה שלמה; columns - סינון עמודות לפי שם, כבר בקריאה.
+    text_columns - עמודות שנקראות תמיד כטקסט"""
+    fmt = fmt or detect_format(source)
+    if fmt == FORMAT_PARQUET:
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(_arrow_source(source))
+        table = parquet.read(columns=_arrow_columns(parquet.schema_arrow, columns))
+        df = table.to_pandas(date_as_object=False)
+    elif fmt == FORMAT_ARROW:
+        import pyarrow as pa
+        table = pa.ipc.open_file(_arrow_source(source)).read_all()
+        df = table.select(_arrow_columns(table.schema, columns)).to_pandas(date_as_object=False)
+    elif fmt == FORMAT_XLSX:
+        df = pd.read_excel(source, usecols=columns)
+    else:
+        dtype = {col: str for col in text_columns}
+        df = pd.read_csv(source, encoding='utf-8-sig', usecols=columns, dtype=dtype or None)
+    return _as_text(_date_text(df), text_columns)
+
+def iter_table_chunks(source, chunk_rows: int, fmt: Optional[str] = None,
+                      columns: Optional[Callable[[str], bool]] = None,
+                      category_columns: Sequence[str] = ()) -> Iterator[pd.DataFrame]:
+    """קריאת טבלה במקטעים של עד chunk_rows שורות. תמיד מוחזר לפחות מקטע אחד
+    (אולי ריק), כך שאפשר לבדוק את הכותרות גם בקובץ בלי שורות.
+    category_columns - עמודות שתמיד טקסט; מוחזרות כקטגוריה, וב-CSV נקראות כך ישירות"""
+    fmt = fmt or detect_format(source)
+    if fmt == FORMAT_CSV:
+        dtype = {col: 'category' for col in category_columns}
+        with pd.read_csv(source, encoding='utf-8-sig', chunksize=chunk_rows,
+                         usecols=columns, dtype=dtype or None) as reader:
+            yield from reader
+        return
+
+    if fmt == FORMAT_PARQUET:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        arrow_source = _arrow_source(source)
+        schema = pq.read_schema(arrow_source)
+        names = _arrow_columns(schema, columns)
+        # ב-Parquet הסוגים שמורים בקובץ, ולכן כל עמודת טקסט נקראת כמילון (קטגוריה)
+        # בלי לבנות מחרוזת לכל שורה
+        text = [name for name in names
+                if pa.types.is_string(schema.field(name).type)
+                or pa.types.is_large_string(schema.field(name).type)]
+        parquet = pq.ParquetFile(arrow_source, read_dictionary=text)
+        batches = parquet.iter_batches(batch_size=chunk_rows, columns=names)
+        empty = parquet.schema_arrow.empty_table().select(names)
+    elif fmt == FORMAT_ARROW:
+        import pyarrow as pa
+        table = pa.ipc.open_file(_arrow_source(source)).read_all()
+        table = table.select(_arrow_columns(table.schema, columns))
+        batches = table.to_batches(max_chunksize=chunk_rows)
+        empty = table.schema.empty_table()
+    else:
+        # Excel לא ניתן לקריאה חלקית - הגיליון נקרא פעם אחת ומחולק למקטעים
+        df = _as_text(read_table(source, fmt, columns), category_columns, category=True)
+        for start in range(0, max(len(df), 1), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+
+    produced = False
+    for batch in batches:
+        produced = True
+        yield _as_text(_date_text(batch.to_pandas(date_as_object=False)),
+                       category_columns, category=True)
+    if not produced:
+        yield _as_text(_date_text(empty.to_pandas(date_as_object=False)),
+                       category_columns, category=True)
+
+def write_table(df: pd.DataFrame, target, fmt: str = FORMAT_CSV) -> None:
+    """כתיבת טבלה לנתיב או לאובייקט קובץ (Parquet/Arrow דורשים pyarrow, Excel - openpyxl)"""
+    if fmt == FORMAT_PARQUET:
+        df.to_parquet(target, index=False)
+    elif fmt == FORMAT_ARROW:
+        df.reset_index(drop=True).to_feather(target)
+    elif fmt == FORMAT_XLSX:
+        df.to_excel(target, index=False)
+    else:
+        df.to_csv(target, index=False, encoding='utf-8-sig')
+
+def table_bytes(df: pd.DataFrame, fmt: str = FORMAT_CSV) -> bytes:
+    """הטבלה כקובץ בזיכרון - להורדה מהאפליקציה"""
+    buffer = io.BytesIO()
+    write_table(df, buffer, fmt)
+    return buffer.getvalue()
@@ -0,0 +1,166 @@
+"""שיבוץ מקבילי לאופק ארוך: חלוקה לשבועות, פתרון כל שבוע בתהליך נפרד ומעבר התאמה
+
+השבועות בלתי תלויים למעט מאזן המשמרות המשותף והכללים שחוצים את גבול השבוע
+(מנוחה בין שבת לראשון, מכסה חודשית). לכן אחרי האיחוד עובר מעבר סדרתי אחד:
+שיבוצים שמפרים כלל בגבולות נזרקים, החורים מושלמים, ועובדים עמוסים מדי
+מוחלפים במועמדים שעבדו פחות.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from .constraints import ShiftConstraints, ShiftRules
+from .dates import parse_date_safe
+from .engine import (
+    ENGINE_OPTIMAL, ENGINE_PARALLEL, ENGINES, CandidateIndex,
+    fill_holes, get_shift_rows
+)
+from .slots import SlotKey
+from .timing import span, timed
+
+logger = logging.getLogger(__name__)
+
+# מתחת לגודל הזה (תאריכים x שורות תבנית) הרמת תהליכים יקרה מהפתרון עצמו
+PARALLEL_MIN_SLOTS = 10000
+
+def partition_by_week(dates: List[str]) -> List[List[str]]:
+    """חלוקת התאריכים לשבועות (ראשון-שבת), בסדר המקורי"""
+    partitions: Dict[int, List[str]] = {}
+    for date_str in dates:
+        partitions.setdefault(parse_date_safe(date_str).toordinal() // 7, []).append(date_str)
+    return list(partitions.values())
+
+def _solve_partition(engine: str, dates: List[str], shi_df: pd.DataFrame, req_df: pd.DataFrame,
+                     balance: Dict[str, int], cancelled: Set[SlotKey],
+                     rules: ShiftRules) -> Dict[SlotKey, str]:
+    """פתרון שבוע אחד בתהליך עובד - עם אינדקס וכללים משלו"""
+    schedule, _ = ENGINES[engine](
+        dates, shi_df, req_df, balance,
+        cancelled=cancelled,
+        constraints=ShiftConstraints(shi_df, rules)
+    )
+    return schedule
+
+def _rebalance(schedule: Dict[SlotKey, str], order: List[SlotKey], shift_rows: List[Tuple],
+               index: CandidateIndex, balance: Dict[str, int],
+               constraints: ShiftConstraints) -> int:
+    """החלפת עובד שעבד לפחות שתי משמרות יותר ממועמד פנוי לאותה משמרת"""
+    totals = balance.copy()
+    for name in schedule.values():
+        totals[name] = totals.get(name, 0) + 1
+    is_atan = {idx: atan for idx, _, _, atan in shift_rows}
+
+    swaps = 0
+    for slot in order:
+        current = schedule.get(slot)
+        if current is None:
+            continue
+        # מועמד מתאים רק אם גם אחרי ההחלפה הוא עדיין עובד פחות (פער של 2 לפחות)
+        best, best_total = None, totals[current] - 1
+        for name in index.candidates(slot.date, slot.station, slot.shift, atan_only=is_atan[slot.row]):
+            total = totals.get(name, 0)
+            if total < best_total and constraints.can_assign(name, slot.date, slot.row):
+                best, best_total = name, total
+        if best is None:
+            continue
+        constraints.remove(current, slot.date, slot.row)
+        constraints.add(best, slot.date, slot.row)
+        schedule[slot] = best
+        totals[current] -= 1
+        totals[best] = totals.get(best, 0) + 1
+        swaps += 1
+    return swaps
+
+@timed('auto_assign', engine=ENGINE_PARALLEL)
+def auto_assign_parallel(dates: List[str], shi_df: pd.DataFrame,
+                         req_df: pd.DataFrame, balance: Dict[str, int],
+                         index: Optional[CandidateIndex] = None,
+                         cancelled: Optional[Set[SlotKey]] = None,
+                         constraints: Optional[ShiftConstraints] = None,
+                         engine: str = ENGINE_OPTIMAL,
+                         workers: Optional[int] = None) -> Tuple[Dict, Dict]:
+    """שיבוץ לפי שבועות במאגר תהליכים; בבעיה קטנה - המנוע הסדרתי ישירות"""
+    if engine == ENGINE_PARALLEL:
+        raise ValueError("the partition engine must be a sequential engine")
+    cancelled = cancelled or set()
+    if constraints is None:
+        constraints = ShiftConstraints(shi_df)
+    partitions = partition_by_week(dates)
+    workers = min(workers or os.cpu_count() or 1, len(partitions))
+
+    # בתוך תהליך עובד (למשל שיבוץ אצווה) לא פותחים מאגר מקונן
+    too_small = len(dates) * len(shi_df) < PARALLEL_MIN_SLOTS
+    if workers <= 1 or too_small or multiprocessing.parent_process() is not None:
+        return ENGINES[engine](dates, shi_df, req_df, balance, index=index,
+                               cancelled=cancelled, constraints=constraints)
+
+    # כל שבוע מקבל רק את הבקשות והביטולים שלו
+    request_dates = req_df['תאריך מבוקש']
+    jobs = []
+    for part in partitions:
+        part_set = set(part)
+        jobs.append((
+            part,
+            req_df[request_dates.isin(part_set)],
+            {slot for slot in cancelled if slot.date in part_set}
+        ))
+
+    # spawn ולא fork - בטוח גם מתוך שרת מרובה תהליכונים (Streamlit)
+    merged: Dict[SlotKey, str] = {}
+    with span('partition_solve', partitions=len(partitions), workers=workers):
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [
+                pool.submit(_solve_partition, engine, part, shi_df, part_req, balance,
+                            part_cancelled, constraints.rules)
+                for part, part_req, part_cancelled in jobs
+            ]
+            for future in futures:
+                merged.update(future.result())
+
+    with span('reconcile') as fields:
+        if index is None:
+            index = CandidateIndex(req_df)
+        shift_rows = get_shift_rows(shi_df)
+        date_pos = {d: i for i, d in enumerate(dates)}
+        order = sorted(merged, key=lambda slot: (date_pos[slot.date], slot.row))
+
+        # 1. כללים שחוצים את גבולות השבוע: שיבוץ שמפר כלל נזרק
+        schedule: Dict[SlotKey, str] = {}
+        dropped_dates = set()
+        for slot in order:
+            name = merged[slot]
+            if constraints.can_assign(name, slot.date, slot.row):
+                constraints.add(name, slot.date, slot.row)
+                schedule[slot] = name
+            else:
+                dropped_dates.add(slot.date)
+
+        # 2. השלמת החורים שנפתחו, מול המצב המאוחד
+        refilled = {}
+        if dropped_dates:
+            refilled = fill_holes([d for d in dates if d in dropped_dates], shi_df, req_df,
+                                  balance, schedule, index=index, cancelled=cancelled,
+                                  constraints=constraints)
+            schedule.update(refilled)
+
+        # 3. איזון: כל שבוע התחיל מאותו מאזן, ולכן עובדים "זולים" נבחרו בכל השבועות
+        swaps = _rebalance(schedule, sorted(schedule, key=lambda s: (date_pos[s.date], s.row)),
+                           shift_rows, index, balance, constraints)
+        fields.update(dropped=len(merged) - len(schedule) + len(refilled),
+                      refilled=len(refilled), swaps=swaps)
+
+    assigned_today: Dict[str, Set[str]] = {d: set() for d in dates}
+    for slot, name in schedule.items():
+        assigned_today[slot.date].add(name)
+
+    logger.info(f"Parallel auto-assignment: {len(schedule)} assigned over "
+                f"{len(partitions)} partitions ({workers} workers), {swaps} rebalance swaps")
+    return schedule, assigned_today
+
+ENGINES[ENGINE_PARALLEL] = auto_assign_parallel
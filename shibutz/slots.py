@@ -0,0 +1,39 @@
+"""מזהה משמרת בלוח"""
+
+from typing import Mapping, NamedTuple
+from urllib.parse import unquote
+
+import numpy as np
+
+def plain(value):
+    """סקלר של numpy (למשל תחנה מספרית שנקראה מהתבנית) כערך Python רגיל"""
+    return value.item() if isinstance(value, np.generic) else value
+
+class SlotKey(NamedTuple):
+    """מזהה משמרת בלוח: תאריך, תחנה, משמרת ומספר השורה בתבנית"""
+    date: str
+    station: str
+    shift: str
+    row: int
+
+    def to_id(self) -> str:
+        """צורה טקסטואלית יציבה - למזהי מסמכים, לייצוא ולמפתחות ווידג'טים.
+        
+        '%', '_' ו-'/' מקודדים בכל רכיב, כך שתחנה עם קו תחתון לא שוברת את הפירוק
+        ותאריך עם '/' לא הופך לנתיב מסמך ב-Firestore.
+        """
+        return '_'.join(
+            str(part).replace('%', '%25').replace('_', '%5F').replace('/', '%2F')
+            for part in self
+        )
+
+    @classmethod
+    def from_row(cls, date_str: str, shift_row: Mapping, row: int) -> 'SlotKey':
+        """מזהה משמרת משורת תבנית - בערכים רגילים, כמו ב-get_shift_rows"""
+        return cls(date_str, plain(shift_row['תחנה']), plain(shift_row['משמרת']), int(row))
+
+    @classmethod
+    def from_id(cls, slot_id: str) -> 'SlotKey':
+        """פירוק מזהה שנוצר ב-to_id"""
+        date_str, station, shift, row = (unquote(part) for part in slot_id.split('_'))
+        return cls(date_str, station, shift, int(row))
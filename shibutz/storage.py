@@ -0,0 +1,595 @@
+"""אחסון שיבוצים ומאזן עובדים - Firestore או SQLite מקומי.
+
+firebase_admin נטען רק כשמשתמשים בפועל ב-Firestore, כך שהספרייה עובדת גם בלעדיו.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .slots import SlotKey
+from .timing import timed
+
+logger = logging.getLogger(__name__)
+
+# מאזן עובדים: מרווח מינימלי בין שאילתות עדכון, וטעינה מלאה תקופתית (כשאין האזנה)
+BALANCE_POLL_SECONDS = 10
+BALANCE_FULL_RELOAD_SECONDS = 15 * 60
+# זמן המתנה מרבי לתמונת המצב הראשונה של ההאזנה, והמתנה לפני ניסיון האזנה חוזר
+BALANCE_LISTEN_TIMEOUT_SECONDS = 10
+BALANCE_RESUBSCRIBE_SECONDS = 60
+# שמירה ל-Firestore: מגבלת פעולות ל-batch (כולל מסמך הסימון), מקביליות וניסיונות חוזרים
+FIRESTORE_BATCH_LIMIT = 500
+SAVE_MAX_WORKERS = 4
+SAVE_MAX_ATTEMPTS = 3
+SAVE_BACKOFF_SECONDS = 0.5
+# מסמכי הסימון נמחקים בסוף השמירה; expire_at - למחיקה ע"י מדיניות TTL אם השמירה נקטעה
+SAVE_MARKER_TTL_DAYS = 7
+# מגבלת הערכים בשאילתת 'in' של Firestore
+FIRESTORE_IN_LIMIT = 30
+# מגבלת פרמטרים בשאילתת SQLite אחת
+SQLITE_PARAMS_LIMIT = 500
+# מנוע אחסון: firestore (ברירת מחדל) או sqlite מקומי
+STORAGE_FIRESTORE = "firestore"
+STORAGE_SQLITE = "sqlite"
+DEFAULT_SQLITE_PATH = "shibutz.db"
+
+def _firestore():
+    """ייבוא עצל של מודול firestore"""
+    from firebase_admin import firestore
+    return firestore
+
+def connect_firestore(credentials_info: Dict):
+    """חיבור ל-Firestore לפי פרטי Service Account (אתחול האפליקציה פעם אחת)"""
+    import firebase_admin
+    from firebase_admin import credentials
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(credentials_info))
+        logger.info("Firebase initialized successfully")
+    return _firestore().client()
+
+class BalanceCache:
+    """מטמון מקומי של employee_history, משותף לכל הסשנים בתהליך.
+    
+    במצב רגיל המטמון מאזין ל-collection (on_snapshot): Firestore דוחף כל מסמך
+    שנוסף, השתנה או נמחק, והשינוי מוחל במקום - קריאה היא העתקה מהזיכרון, בלי
+    שאילתה, והמאזן מתעדכן שניות אחרי שמישהו אחר שמר. הסריקה המלאה היחידה היא
+    תמונת המצב הראשונה של ההאזנה.
+    
+    אם ההאזנה לא זמינה או נפלה - חזרה לטעינה מלאה ואחריה רק מסמכים שעודכנו.
+    במצב זה מסמכים ללא last_updated (למשל כאלה שנכתבו בגרסה הישנה) נקלטים רק
+    בטעינה המלאה התקופתית, שגם מיישרת מחיקות ושינויים ידניים ב-Database.
+    """
+
+    def __init__(self, client, listen: bool = True):
+        self._db = client
+        self._scores: Dict[str, int] = {}
+        self._high_water = None
+        self._last_full = None
+        self._last_poll = None
+        self._stale = False
+        self._lock = threading.Lock()
+        self._listen = listen
+        self._watch = None
+        self._ready = threading.Event()
+        self._listen_lock = threading.Lock()
+        self._last_subscribe = None
+
+    def get(self) -> Dict[str, int]:
+        """המאזן העדכני (עותק), תוך משיכת השינויים מאז הקריאה הקודמת"""
+        if self._listening():
+            with self._lock:
+                return dict(self._scores)
+        with self._lock:
+            now = time.monotonic()
+            if self._last_full is None or now - self._last_full >= BALANCE_FULL_RELOAD_SECONDS:
+                self._full_reload()
+                self._last_full = self._last_poll = now
+            elif self._stale or now - self._last_poll >= BALANCE_POLL_SECONDS:
+                self._fetch_updates()
+                self._last_poll = now
+            self._stale = False
+            return dict(self._scores)
+
+    def invalidate(self):
+        """משיכת עדכונים כבר בקריאה הבאה (למשל אחרי שמירה); בהאזנה העדכון נדחף ממילא"""
+        with self._lock:
+            self._stale = True
+
+    def close(self):
+        """הפסקת ההאזנה"""
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def _listening(self) -> bool:
+        """האם ההאזנה פעילה ומעודכנת; אם לא - ניסיון להתחיל אותה (לכל היותר פעם בדקה)"""
+        if not self._listen:
+            return False
+        with self._listen_lock:
+            if self._watch is not None and not self._watch.is_active:
+                logger.warning("Balance listener stopped, falling back to polling")
+                self.close()
+            if self._watch is None:
+                if (self._last_subscribe is not None
+                        and time.monotonic() - self._last_subscribe < BALANCE_RESUBSCRIBE_SECONDS):
+                    return False
+                self._subscribe()
+            return self._ready.is_set()
+
+    def _subscribe(self) -> None:
+        """פתיחת ההאזנה והמתנה לתמונת המצב הראשונה"""
+        self._last_subscribe = time.monotonic()
+        self._ready.clear()
+        try:
+            self._watch = self._db.collection('employee_history').on_snapshot(self._on_snapshot)
+        except Exception as e:
+            logger.warning(f"Balance listener unavailable, polling instead: {e}")
+            return
+        if self._ready.wait(BALANCE_LISTEN_TIMEOUT_SECONDS):
+            logger.info(f"Balance listener active: {len(self._scores)} employees")
+        else:
+            logger.warning("Balance listener has not delivered a snapshot yet, polling meanwhile")
+
+    def _on_snapshot(self, collection_snapshot, changes, read_time):
+        """נקרא מתהליכון ההאזנה: רק המסמכים שהשתנו מוחלים במקום"""
+        with self._lock:
+            if not self._ready.is_set():
+                # תמונת מצב ראשונה (גם אחרי חיבור מחדש) - מחליפה את כל המאזן
+                self._scores = {}
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    self._scores.pop(change.document.id, None)
+                else:
+                    self._apply(change.document)
+            # הטעינה התקופתית נחשבת עדכנית - למקרה שההאזנה תיפול
+            self._last_full = self._last_poll = time.monotonic()
+        self._ready.set()
+
+    def _apply(self, doc) -> None:
+        data = doc.to_dict() or {}
+        self._scores[doc.id] = data.get('total_shifts', 0)
+        updated = data.get('last_updated')
+        if updated is not None and (self._high_water is None or updated > self._high_water):
+            self._high_water = updated
+
+    def _full_reload(self):
+        self._scores = {}
+        self._high_water = None
+        for doc in self._db.collection('employee_history').stream():
+            self._apply(doc)
+        logger.info(f"Loaded balance for {len(self._scores)} employees")
+
+    def _fetch_updates(self):
+        if self._high_water is None:
+            self._full_reload()
+            return
+        # ">=" ולא ">" - מסמך שנכתב באותה חותמת זמן לא יפוספס (הקריאה החוזרת אידמפוטנטית)
+        query = self._db.collection('employee_history').where(
+            filter=_firestore().FieldFilter('last_updated', '>=', self._high_water)
+        )
+        count = 0
+        for doc in query.stream():
+            self._apply(doc)
+            count += 1
+        logger.info(f"Balance refresh: {count} updated employees")
+
+def commit_in_chunks(client, writes: List[Tuple], save_id: str,
+                     on_progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """כתיבת רשימת (ref, data, merge) בחבילות של עד 500 פעולות, במקביל ועם ניסיונות חוזרים.
+    data=None - מחיקת המסמך."""
+    size = FIRESTORE_BATCH_LIMIT - 1
+    return commit_chunks(client, [writes[i:i + size] for i in range(0, len(writes), size)],
+                         save_id, on_progress)
+
+def commit_chunks(client, chunks: List[List[Tuple]], save_id: str,
+                  on_progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """כתיבת חבילות מוכנות (כל אחת עד 499 פעולות) - כל חבילה ב-commit אטומי אחד.
+    
+    כל חבילה כותבת גם מסמך סימון ב-save_batches באותו commit אטומי. לפני ניסיון חוזר
+    בודקים אם הסימון כבר קיים, כך ש-Increment לא נספר פעמיים אם ה-commit הצליח
+    אבל התשובה אבדה בדרך. הסימונים נחוצים רק בתוך השמירה, ונמחקים בסופה.
+    מחזיר את מספר החבילות; זורק שגיאה אם חבילה נכשלה סופית.
+    """
+    firestore = _firestore()
+    markers = [client.collection('save_batches').document(f"{save_id}-{chunk_no}")
+               for chunk_no in range(len(chunks))]
+    expire_at = datetime.now(timezone.utc) + timedelta(days=SAVE_MARKER_TTL_DAYS)
+    
+    def commit_chunk(chunk_no: int, chunk: List[Tuple]):
+        marker = markers[chunk_no]
+        for attempt in range(SAVE_MAX_ATTEMPTS):
+            try:
+                if attempt and marker.get().exists:
+                    return
+                batch = client.batch()
+                for ref, data, merge in chunk:
+                    if data is None:
+                        batch.delete(ref)
+                    else:
+                        batch.set(ref, data, merge=merge)
+                batch.set(marker, {'ops': len(chunk), 'timestamp': firestore.SERVER_TIMESTAMP,
+                                   'expire_at': expire_at})
+                batch.commit()
+                return
+            except Exception as e:
+                if attempt == SAVE_MAX_ATTEMPTS - 1:
+                    raise
+                logger.warning(f"Chunk {chunk_no} commit failed (attempt {attempt + 1}): {e}")
+                time.sleep(SAVE_BACKOFF_SECONDS * 2 ** attempt)
+    
+    done = 0
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, min(SAVE_MAX_WORKERS, len(chunks)))) as pool:
+        futures = {pool.submit(commit_chunk, n, chunk): n for n, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                done += 1
+            except Exception as e:
+                failures.append(futures[future])
+                logger.error(f"Chunk {futures[future]} of save {save_id} failed: {e}")
+            if on_progress:
+                on_progress(done, len(chunks))
+    
+    # אין עוד ניסיונות חוזרים עם save_id הזה - גם אחרי כישלון
+    _delete_markers(client, markers, save_id)
+    if failures:
+        raise RuntimeError(f"נשמרו {done} מתוך {len(chunks)} חבילות (נכשלו: {sorted(failures)})")
+    return len(chunks)
+
+def _delete_markers(client, markers: List, save_id: str) -> None:
+    """מחיקת מסמכי הסימון של שמירה; כישלון לא מכשיל את השמירה - ה-TTL ינקה אותם"""
+    try:
+        for start in range(0, len(markers), FIRESTORE_BATCH_LIMIT):
+            batch = client.batch()
+            for marker in markers[start:start + FIRESTORE_BATCH_LIMIT]:
+                batch.delete(marker)
+            batch.commit()
+    except Exception as e:
+        logger.warning(f"Markers of save {save_id} not deleted: {e}")
+
+def schedule_records(schedule: Dict[SlotKey, str]) -> List[Dict]:
+    """המרת השיבוץ לרשומות שמירה (מזהה מסמך, עובד, תאריך, תחנה, משמרת)"""
+    records = []
+    for shift_key, employee in schedule.items():
+        records.append({
+            'id': shift_key.to_id(),
+            'employee': employee,
+            'date': shift_key.date,
+            # תמיד טקסט, גם כשהתחנה או המשמרת בתבנית מספריות
+            'station': str(shift_key.station),
+            'shift': str(shift_key.shift)
+        })
+    return records
+
+def count_shifts(schedule: Dict[SlotKey, str]) -> Dict[str, int]:
+    """מספר המשמרות של כל עובד בשיבוץ"""
+    employee_counts = {}
+    for employee in schedule.values():
+        employee_counts[employee] = employee_counts.get(employee, 0) + 1
+    return employee_counts
+
+class ScheduleDelta(NamedTuple):
+    """ההבדל בין השיבוץ הנוכחי לשיבוץ השמור: מה לכתוב, מה למחוק ושינוי המאזן לכל עובד"""
+    upserts: List[Dict]
+    removed: List[str]
+    counts: Dict[str, int]
+
+    @property
+    def empty(self) -> bool:
+        return not (self.upserts or self.removed or self.counts)
+
+def schedule_delta(schedule: Dict[SlotKey, str], committed: Dict[str, str]) -> ScheduleDelta:
+    """השוואה מול השיבוץ השמור (מזהה מסמך -> עובד). משמרת שהעובד בה הוחלף נכתבת מחדש
+    ומזיזה משמרת אחת מהעובד הקודם לחדש; משמרת שהוסרה נמחקת ומורידה משמרת מהמאזן"""
+    current = {shift_key.to_id(): (shift_key, employee) for shift_key, employee in schedule.items()}
+    changed = {
+        shift_key: employee for slot_id, (shift_key, employee) in current.items()
+        if committed.get(slot_id) != employee
+    }
+    removed = [slot_id for slot_id in committed if slot_id not in current]
+    
+    counts = count_shifts(changed)
+    for slot_id, employee in committed.items():
+        if slot_id not in current or current[slot_id][1] != employee:
+            counts[employee] = counts.get(employee, 0) - 1
+    counts = {employee: count for employee, count in counts.items() if count}
+    return ScheduleDelta(schedule_records(changed), removed, counts)
+
+class ScheduleStorage:
+    """ממשק אחסון: קריאת מאזן, כתיבת שיבוצים ועדכון היסטוריית עובדים"""
+    name = ""
+
+    def load_balance(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def load_assignments(self, dates: List[str]) -> Dict[str, str]:
+        """השיבוצים השמורים בתאריכים האלה: מזהה מסמך -> עובד"""
+        raise NotImplementedError
+
+    def delete_assignments(self, slot_ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def write_assignments(self, records: List[Dict]) -> None:
+        raise NotImplementedError
+
+    def increment_history(self, counts: Dict[str, int]) -> None:
+        raise NotImplementedError
+
+    def invalidate(self) -> None:
+        """סימון שהמאזן השתנה מחוץ לקריאות load_balance"""
+
+    def save_schedule(self, schedule: Dict[SlotKey, str],
+                      on_progress: Optional[Callable[[int, int], None]] = None) -> None:
+        """שמירת השיבוצים ועדכון המאזן של העובדים המשובצים"""
+        self.write_assignments(schedule_records(schedule))
+        self.increment_history(count_shifts(schedule))
+        if on_progress:
+            on_progress(1, 1)
+
+    def save_changes(self, schedule: Dict[SlotKey, str], committed: Dict[str, str],
+                     on_progress: Optional[Callable[[int, int], None]] = None) -> ScheduleDelta:
+        """שמירת ההבדל בלבד מול השיבוץ השמור - שמירה חוזרת לא סופרת משמרות פעמיים"""
+        delta = schedule_delta(schedule, committed)
+        self.write_assignments(delta.upserts)
+        self.delete_assignments(delta.removed)
+        self.increment_history(delta.counts)
+        if on_progress:
+            on_progress(1, 1)
+        return delta
+
+class FirestoreStorage(ScheduleStorage):
+    """אחסון ב-Firestore: מאזן דרך BalanceCache, כתיבה בחבילות מקבילות"""
+    name = STORAGE_FIRESTORE
+
+    def __init__(self, client, listen: bool = True):
+        self._db = client
+        self._balance = BalanceCache(client, listen)
+
+    @timed('balance_fetch', backend=STORAGE_FIRESTORE)
+    def load_balance(self) -> Dict[str, int]:
+        return self._balance.get()
+
+    def invalidate(self) -> None:
+        self._balance.invalidate()
+
+    def load_assignments(self, dates: List[str]) -> Dict[str, str]:
+        firestore = _firestore()
+        committed = {}
+        for i in range(0, len(dates), FIRESTORE_IN_LIMIT):
+            query = self._db.collection('assignments').where(
+                filter=firestore.FieldFilter('date', 'in', dates[i:i + FIRESTORE_IN_LIMIT])
+            )
+            for doc in query.stream():
+                committed[doc.id] = (doc.to_dict() or {}).get('employee')
+        return committed
+
+    def _assignment_writes(self, records: List[Dict]) -> List[Tuple]:
+        timestamp = _firestore().SERVER_TIMESTAMP
+        return [
+            (self._db.collection('assignments').document(r['id']), {
+                'employee': r['employee'],
+                'date': r['date'],
+                'station': r['station'],
+                'shift': r['shift'],
+                'timestamp': timestamp
+            }, False)
+            for r in records
+        ]
+
+    def _history_writes(self, counts: Dict[str, int]) -> List[Tuple]:
+        firestore = _firestore()
+        timestamp = firestore.SERVER_TIMESTAMP
+        return [
+            (self._db.collection('employee_history').document(employee), {
+                'total_shifts': firestore.Increment(count),
+                'last_updated': timestamp
+            }, True)
+            for employee, count in counts.items()
+        ]
+
+    def _delete_writes(self, slot_ids: List[str]) -> List[Tuple]:
+        return [(self._db.collection('assignments').document(slot_id), None, False) for slot_id in slot_ids]
+
+    def write_assignments(self, records: List[Dict]) -> None:
+        commit_in_chunks(self._db, self._assignment_writes(records), uuid.uuid4().hex)
+
+    def delete_assignments(self, slot_ids: List[str]) -> None:
+        commit_in_chunks(self._db, self._delete_writes(slot_ids), uuid.uuid4().hex)
+
+    def increment_history(self, counts: Dict[str, int]) -> None:
+        commit_in_chunks(self._db, self._history_writes(counts), uuid.uuid4().hex)
+
+    def _delta_chunks(self, delta: ScheduleDelta, committed: Dict[str, str]) -> List[List[Tuple]]:
+        """חבילות שבהן כל שיבוץ נכתב יחד עם שינוי המאזן שלו (לעובד החדש ולקודם).
+        
+        חבילה נכשלת או מצליחה בשלמותה, כך שמאזן לא נכתב בלי השיבוצים שלו ולהפך;
+        בתוך חבילה השינויים לכל עובד מצטברים לעדכון Increment אחד.
+        """
+        units = []
+        for record in delta.upserts:
+            counts = {record['employee']: 1}
+            previous = committed.get(record['id'])
+            if previous is not None:
+                counts[previous] = counts.get(previous, 0) - 1
+            units.append((self._assignment_writes([record])[0], counts))
+        for slot_id in delta.removed:
+            units.append((self._delete_writes([slot_id])[0], {committed[slot_id]: -1}))
+        
+        chunks = []
+        writes: List[Tuple] = []
+        counts: Dict[str, int] = {}
+        
+        def flush():
+            chunks.append(writes + self._history_writes(
+                {employee: count for employee, count in counts.items() if count}
+            ))
+        
+        for write, unit_counts in units:
+            employees = counts.keys() | unit_counts.keys()
+            if writes and len(writes) + 1 + len(employees) > FIRESTORE_BATCH_LIMIT - 1:
+                flush()
+                writes, counts = [], {}
+            writes.append(write)
+            for employee, count in unit_counts.items():
+                counts[employee] = counts.get(employee, 0) + count
+        if writes:
+            flush()
+        return chunks
+
+    @timed('commit', backend=STORAGE_FIRESTORE)
+    def save_schedule(self, schedule: Dict[SlotKey, str],
+                      on_progress: Optional[Callable[[int, int], None]] = None) -> None:
+        # כל החבילות נכתבות במקביל; כל שיבוץ באותה חבילה עם עדכון המאזן שלו
+        chunks = commit_chunks(self._db, self._delta_chunks(schedule_delta(schedule, {}), {}),
+                               uuid.uuid4().hex, on_progress)
+        logger.info(f"Saved {len(schedule)} assignments to Firebase in {chunks} batches")
+
+    @timed('commit', backend=STORAGE_FIRESTORE, mode='delta')
+    def save_changes(self, schedule: Dict[SlotKey, str], committed: Dict[str, str],
+                     on_progress: Optional[Callable[[int, int], None]] = None) -> ScheduleDelta:
+        delta = schedule_delta(schedule, committed)
+        chunks = commit_chunks(self._db, self._delta_chunks(delta, committed),
+                               uuid.uuid4().hex, on_progress)
+        logger.info(f"Saved delta to Firebase: {len(delta.upserts)} written, "
+                    f"{len(delta.removed)} deleted, {len(delta.counts)} balances in {chunks} batches")
+        return delta
+
+class SQLiteStorage(ScheduleStorage):
+    """אחסון מקומי ב-SQLite (מצב WAL) - לעבודה ללא רשת, בדיקות עומס ומדידות.
+    
+    המאזן נשמר בזיכרון, משותף לכל הסשנים בתהליך, ובמקום האזנה של Firestore:
+    שמירות דרך החיבור הזה מוחלות במקום, וכתיבה מחיבור או מתהליך אחר מתגלה
+    דרך PRAGMA data_version (בדיקה זולה, בלי סריקה) וגורמת לטעינה מחדש.
+    """
+    name = STORAGE_SQLITE
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._balance: Optional[Dict[str, int]] = None
+        self._data_version = None
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS assignments ("
+                "id TEXT PRIMARY KEY, employee TEXT NOT NULL, date TEXT, "
+                "station TEXT, shift TEXT, timestamp TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS employee_history ("
+                "employee TEXT PRIMARY KEY, total_shifts INTEGER NOT NULL DEFAULT 0, "
+                "last_updated TEXT)"
+            )
+
+    @timed('balance_fetch', backend=STORAGE_SQLITE)
+    def load_balance(self) -> Dict[str, int]:
+        with self._lock:
+            # data_version משתנה רק כשחיבור אחר כותב לקובץ
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._balance is None or version != self._data_version:
+                rows = self._conn.execute("SELECT employee, total_shifts FROM employee_history").fetchall()
+                self._balance = dict(rows)
+                self._data_version = version
+            return dict(self._balance)
+
+    def load_assignments(self, dates: List[str]) -> Dict[str, str]:
+        committed = {}
+        with self._lock:
+            for i in range(0, len(dates), SQLITE_PARAMS_LIMIT):
+                chunk = dates[i:i + SQLITE_PARAMS_LIMIT]
+                committed.update(self._conn.execute(
+                    f"SELECT id, employee FROM assignments WHERE date IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall())
+        return committed
+
+    # הפעולות עצמן, בלי טרנזקציה - הקורא פותח אחת (with self._lock, self._conn)
+    def _delete_rows(self, slot_ids: List[str]) -> None:
+        self._conn.executemany("DELETE FROM assignments WHERE id = ?", [(i,) for i in slot_ids])
+
+    def _upsert_rows(self, records: List[Dict], timestamp: str) -> None:
+        self._conn.executemany(
+            "INSERT INTO assignments (id, employee, date, station, shift, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET employee = excluded.employee, date = excluded.date, "
+            "station = excluded.station, shift = excluded.shift, timestamp = excluded.timestamp",
+            [(r['id'], r['employee'], r['date'], r['station'], r['shift'], timestamp) for r in records]
+        )
+
+    def _increment_rows(self, counts: Dict[str, int], timestamp: str) -> None:
+        self._conn.executemany(
+            "INSERT INTO employee_history (employee, total_shifts, last_updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(employee) DO UPDATE SET "
+            "total_shifts = total_shifts + excluded.total_shifts, last_updated = excluded.last_updated",
+            [(employee, count, timestamp) for employee, count in counts.items()]
+        )
+
+    def _apply_balance(self, counts: Dict[str, int]) -> None:
+        """עדכון המאזן בזיכרון - רק אחרי שהטרנזקציה נשמרה"""
+        if self._balance is not None:
+            for employee, count in counts.items():
+                self._balance[employee] = self._balance.get(employee, 0) + count
+
+    def _apply_delta(self, delta: ScheduleDelta) -> None:
+        """שיבוצים, מחיקות ומאזן בטרנזקציה אחת - או הכול או כלום"""
+        timestamp = datetime.now().isoformat()
+        with self._lock:
+            with self._conn:
+                self._upsert_rows(delta.upserts, timestamp)
+                self._delete_rows(delta.removed)
+                self._increment_rows(delta.counts, timestamp)
+            self._apply_balance(delta.counts)
+
+    def delete_assignments(self, slot_ids: List[str]) -> None:
+        with self._lock, self._conn:
+            self._delete_rows(slot_ids)
+
+    def write_assignments(self, records: List[Dict]) -> None:
+        with self._lock, self._conn:
+            self._upsert_rows(records, datetime.now().isoformat())
+
+    def increment_history(self, counts: Dict[str, int]) -> None:
+        with self._lock:
+            with self._conn:
+                self._increment_rows(counts, datetime.now().isoformat())
+            self._apply_balance(counts)
+
+    @timed('commit', backend=STORAGE_SQLITE)
+    def save_schedule(self, schedule: Dict[SlotKey, str],
+                      on_progress: Optional[Callable[[int, int], None]] = None) -> None:
+        self._apply_delta(schedule_delta(schedule, {}))
+        if on_progress:
+            on_progress(1, 1)
+        logger.info(f"Saved {len(schedule)} assignments to SQLite ({self.path})")
+
+    @timed('commit', backend=STORAGE_SQLITE, mode='delta')
+    def save_changes(self, schedule: Dict[SlotKey, str], committed: Dict[str, str],
+                     on_progress: Optional[Callable[[int, int], None]] = None) -> ScheduleDelta:
+        delta = schedule_delta(schedule, committed)
+        self._apply_delta(delta)
+        if on_progress:
+            on_progress(1, 1)
+        logger.info(f"Saved delta to SQLite: {len(delta.upserts)} written, "
+                    f"{len(delta.removed)} deleted, {len(delta.counts)} balances")
+        return delta
+
+def open_storage(backend: str = STORAGE_FIRESTORE, path: str = DEFAULT_SQLITE_PATH,
+                 credentials_info: Optional[Dict] = None, listen: bool = True) -> ScheduleStorage:
+    """יצירת מנוע אחסון לפי שם (לשימוש מחוץ לאפליקציה, למשל בהרצות אצווה).
+    listen=False - בלי האזנה למאזן, למשל בקריאה חד-פעמית"""
+    if backend == STORAGE_SQLITE:
+        return SQLiteStorage(path)
+    if backend == STORAGE_FIRESTORE:
+        if credentials_info is None:
+            raise ValueError("Firestore storage requires service account credentials")
+        return FirestoreStorage(connect_firestore(credentials_info), listen)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,72 @@
+"""מדידת זמנים בנתיב החם - כל מקטע נרשם כשורת לוג JSON ונאסף לרשימת ההרצה הנוכחית"""
+
+import functools
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# המקטעים של ההרצה הנוכחית (למשל הרצה אחת של סקריפט Streamlit); None - לא נאספים
+_current_spans: ContextVar[Optional[List[Dict]]] = ContextVar('shibutz_spans', default=None)
+
+def start_recording() -> List[Dict]:
+    """התחלת איסוף מקטעים בהקשר הנוכחי; הרשימה המוחזרת מתמלאת במהלך ההרצה"""
+    spans: List[Dict] = []
+    _current_spans.set(spans)
+    return spans
+
+def record_span(name: str, ms: float, **fields) -> Dict:
+    """רישום מקטע שמשכו כבר ידוע - שורת לוג והוספה לרשימת ההרצה"""
+    record = {'span': name, 'ms': round(ms, 2), **fields}
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
+    spans = _current_spans.get()
+    if spans is not None:
+        spans.append(record)
+    return record
+
+@contextmanager
+def span(name: str, **fields) -> Iterator[Dict]:
+    """מדידת מקטע קוד. שדות נוספים אפשר להוסיף למילון המוחזר בתוך הבלוק"""
+    start = time.perf_counter()
+    try:
+        yield fields
+    except Exception as e:
+        # רק שגיאות אמיתיות; st.rerun / st.stop (BaseException) אינם שגיאה
+        fields['error'] = type(e).__name__
+        raise
+    finally:
+        record_span(name, (time.perf_counter() - start) * 1000, **fields)
+
+class SpanTotal:
+    """מקטע שנמדד בכמה חלקים (למשל פעם לכל מקטע של קובץ) ונרשם פעם אחת, עם סכום הזמנים"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ms = 0.0
+        self.parts = 0
+
+    @contextmanager
+    def part(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.ms += (time.perf_counter() - start) * 1000
+            self.parts += 1
+
+    def record(self, **fields) -> Dict:
+        return record_span(self.name, self.ms, parts=self.parts, **fields)
+
+def timed(name: str, **fields) -> Callable:
+    """דקורטור: כל קריאה לפונקציה נמדדת כמקטע"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **fields):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,31 @@
+"""בדיקות לשמות קבצי הפלט של שיבוץ אצווה"""
+
+import pytest
+
+from benchmarks.synthetic import generate_inputs
+from shibutz.batch import Unit, run_batch, unit_name_error
+from shibutz.cli import main
+
+@pytest.mark.parametrize('name', ['', '../north', 'a/b', 'a\\b', '..', '_summary', '_SUMMARY', float('nan')])
+def test_unit_name_rejected(name):
+    assert unit_name_error(name)
+
+def test_run_batch_rejects_path_in_name(tmp_path):
+    with pytest.raises(ValueError):
+        list(run_batch([Unit('../escape', 'requests.csv', 'shifts.csv')], out_dir=str(tmp_path)))
+    assert not (tmp_path.parent / 'escape.csv').exists()
+
+def test_cli_writes_units_and_reserved_summary(tmp_path):
+    req_df, shi_df = generate_inputs(n_employees=20, n_dates=5, n_stations=2)
+    req_df.to_csv(tmp_path / 'requests.csv', index=False, encoding='utf-8-sig')
+    shi_df.to_csv(tmp_path / 'shifts.csv', index=False, encoding='utf-8-sig')
+    out_dir = tmp_path / 'output'
+
+    code = main(['--unit', 'summary', str(tmp_path / 'requests.csv'), str(tmp_path / 'shifts.csv'),
+                 '--out-dir', str(out_dir), '--workers', '1'])
+    assert code == 0
+    assert sorted(path.name for path in out_dir.iterdir()) == ['_summary.csv', 'summary.csv']
+
+    with pytest.raises(SystemExit):
+        main(['--unit', '_summary', str(tmp_path / 'requests.csv'), str(tmp_path / 'shifts.csv'),
+              '--out-dir', str(out_dir)])
@@ -0,0 +1,33 @@
+"""בדיקות לטעינת קבצי הקלט במקטעים"""
+
+import pandas as pd
+
+from shibutz import auto_assign, load_tables, named_buffer, table_bytes
+
+def upload(df, name):
+    return named_buffer(table_bytes(df), name)
+
+def test_chunked_load_matches_whole_file():
+    """תחנה '1' ותחנה 'x' בתבנית - מקטע עם תחנה 1 בלבד לא נקרא כמספר"""
+    shi_df = pd.DataFrame({'תחנה': ['1', 'x'], 'משמרת': ['בוקר', 'בוקר'], 'סוג תקן': ['רגיל', 'רגיל']})
+    req_df = pd.DataFrame({
+        'שם': ['דני', 'רון'], 'תאריך מבוקש': ['01/03/2026', '01/03/2026'],
+        'משמרת': ['בוקר', 'בוקר'], 'תחנה': ['1', 'x'], 'מורשה אט"ן': ['לא', 'לא']
+    })
+    schedules = []
+    for chunk_rows in (1, None):
+        kwargs = {'chunk_rows': chunk_rows} if chunk_rows else {}
+        data = load_tables(upload(req_df, 'requests.csv'), upload(shi_df, 'shifts.csv'), **kwargs)
+        assert data.errors == []
+        schedule, _ = auto_assign(data.dates, data.shi_df, data.req_df, {}, data.index)
+        schedules.append(schedule)
+    assert schedules[0] == schedules[1]
+    assert sorted(schedules[0].values()) == ['דני', 'רון']
+
+def test_blank_trailing_chunk_reports_bad_dates():
+    """מקטע שכולו שורות ריקות - עמודת תאריך בלי אף ערך"""
+    shi_df = pd.DataFrame({'תחנה': ['א'], 'משמרת': ['בוקר'], 'סוג תקן': ['רגיל']})
+    text = 'שם,תאריך מבוקש,משמרת,תחנה\n' + 'דני,01/03/2026,בוקר,א\n' * 4 + ',,,\n' * 2
+    data = load_tables(named_buffer(text.encode(), 'requests.csv'), upload(shi_df, 'shifts.csv'),
+                       chunk_rows=4)
+    assert data.errors[0].startswith("❌ פורמט תאריך לא תקין ב-2 שורות")
@@ -0,0 +1,67 @@
+"""בדיקות למנוע השיבוץ החמדני מול הלולאה המקורית"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_dates, generate_inputs
+from shibutz import SlotKey, auto_assign, fill_holes, get_atan_column
+
+def reference_assign(dates, shi_df, req_df, balance):
+    """הלולאה המקורית: סינון הבקשות לכל משמרת ומיון יציב לפי מאזן (בשוויון - הראשון בקובץ)"""
+    schedule = {}
+    assigned_today = {d: set() for d in dates}
+    running_balance = balance.copy()
+    atan_col = get_atan_column(req_df)
+    for date_str in dates:
+        for idx, shift_row in shi_df.iterrows():
+            potential = req_df[
+                (req_df['תאריך מבוקש'] == date_str) &
+                (req_df['משמרת'] == shift_row['משמרת']) &
+                (req_df['תחנה'] == shift_row['תחנה']) &
+                (~req_df['שם'].isin(assigned_today[date_str]))
+            ].copy()
+            if "אט" in str(shift_row['סוג תקן']) and atan_col:
+                potential = potential[potential[atan_col] == 'כן']
+            if potential.empty:
+                continue
+            potential['score'] = potential['שם'].map(lambda x: running_balance.get(x, 0))
+            best_employee = potential.sort_values('score', kind='stable').iloc[0]['שם']
+            schedule[SlotKey(date_str, shift_row['תחנה'], shift_row['משמרת'], idx)] = best_employee
+            assigned_today[date_str].add(best_employee)
+            running_balance[best_employee] = running_balance.get(best_employee, 0) + 1
+    return schedule
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_auto_assign_matches_reference_loop(seed):
+    req_df, shi_df = generate_inputs(n_employees=60, n_dates=10, n_stations=4, seed=seed)
+    dates = generate_dates(10)
+    # מאזן פתיחה אקראי, כדי שהבחירה לא תיקבע רק לפי הסדר בקובץ
+    rng = np.random.default_rng(seed)
+    names = pd.unique(req_df['שם'])
+    balance = dict(zip(names, rng.integers(0, 4, size=len(names)).tolist()))
+
+    schedule, _ = auto_assign(dates, shi_df, req_df, balance)
+    expected = reference_assign(dates, shi_df, req_df, balance)
+    assert expected
+    assert schedule == expected
+
+def test_fill_holes_counts_only_unsaved_assignments():
+    """המאזן השמור כבר כולל את השיבוצים השמורים - הם לא נספרים שוב"""
+    shi_df = pd.DataFrame({'תחנה': ['א', 'א'], 'משמרת': ['בוקר', 'ערב'], 'סוג תקן': ['רגיל', 'רגיל']})
+    req_df = pd.DataFrame({
+        'שם': ['דני', 'רון', 'דני', 'רון'],
+        'תאריך מבוקש': ['01/03/2026', '01/03/2026', '02/03/2026', '02/03/2026'],
+        'משמרת': ['בוקר', 'בוקר', 'ערב', 'ערב'], 'תחנה': ['א', 'א', 'א', 'א']
+    })
+    saved = SlotKey('01/03/2026', 'א', 'בוקר', 0)
+    schedule = {saved: 'דני'}
+    # המשמרת השמורה של דני כבר כלולה ב-3 שלו - תיקו, ודני ראשון בקובץ
+    balance = {'דני': 3, 'רון': 3}
+    
+    added = fill_holes(['02/03/2026'], shi_df, req_df, balance, schedule,
+                       committed={saved.to_id(): 'דני'})
+    assert added == {SlotKey('02/03/2026', 'א', 'ערב', 1): 'דני'}
+    # בלי committed השיבוץ נספר פעמיים והמשמרת עוברת לרון
+    added = fill_holes(['02/03/2026'], shi_df, req_df, balance, schedule)
+    assert added == {SlotKey('02/03/2026', 'א', 'ערב', 1): 'רון'}
@@ -0,0 +1,149 @@
+"""בדיקות לשמירה: רשומות השיבוץ ושמירת ההבדל במנועי האחסון"""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from shibutz import FirestoreStorage, SQLiteStorage, SlotKey, get_shift_rows, schedule_records
+from shibutz import storage as storage_module
+
+class FakeDocument:
+    def __init__(self, path):
+        self.path = path
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocument(f"{self.name}/{doc_id}")
+
+class FakeClient:
+    def collection(self, name):
+        return FakeCollection(name)
+
+@pytest.fixture
+def shi_df():
+    return pd.DataFrame({'תחנה': [5, 7], 'משמרת': ['בוקר', 'ערב'], 'סוג תקן': ['רגיל', 'אט"ן']})
+
+def test_from_row_uses_plain_values(shi_df):
+    shift_key = SlotKey.from_row('01/03/2026', shi_df.loc[0], np.int64(0))
+    assert type(shift_key.station) is int
+    assert type(shift_key.row) is int
+    # אותו מזהה כמו במנועי השיבוץ
+    idx, station, shift, _ = get_shift_rows(shi_df)[0]
+    assert shift_key == SlotKey('01/03/2026', station, shift, idx)
+
+def test_schedule_records_store_station_as_text():
+    shift_key = SlotKey('01/03/2026', np.int64(5), np.int64(2), 0)
+    (record,) = schedule_records({shift_key: 'דני'})
+    assert record == {
+        'id': '01%2F03%2F2026_5_2_0', 'employee': 'דני',
+        'date': '01/03/2026', 'station': '5', 'shift': '2'
+    }
+    assert SlotKey.from_id(record['id']) == SlotKey('01/03/2026', '5', '2', 0)
+
+def test_firestore_writes_encode_numeric_station(shi_df):
+    pytest.importorskip('firebase_admin')
+    from google.cloud.firestore_v1 import _helpers
+    storage = FirestoreStorage(FakeClient(), listen=False)
+    schedule = {SlotKey('01/03/2026', shi_df.loc[0, 'תחנה'], 'בוקר', 0): 'דני'}
+    (write,) = storage._assignment_writes(schedule_records(schedule))
+    ref, data, merge = write
+    assert ref.path == 'assignments/01%2F03%2F2026_5_בוקר_0'
+    assert data['station'] == '5'
+    # זורק TypeError על סקלר של numpy
+    for field in ('employee', 'date', 'station', 'shift'):
+        _helpers.encode_value(data[field])
+
+def test_sqlite_delta_is_one_transaction(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / 'shibutz.db'))
+    first = SlotKey('01/03/2026', 'א', 'בוקר', 0)
+    storage.save_changes({first: 'דני'}, {})
+    
+    def fail(counts, timestamp):
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(storage, '_increment_rows', fail)
+    with pytest.raises(sqlite3.OperationalError):
+        storage.save_changes({first: 'רון'}, {first.to_id(): 'דני'})
+    # השיבוץ לא נכתב בלי המאזן שלו
+    assert storage.load_assignments(['01/03/2026']) == {first.to_id(): 'דני'}
+    assert storage.load_balance() == {'דני': 1}
+
+def test_delta_against_fresh_snapshot_keeps_balance(tmp_path):
+    """רכז א' שומר, ורכז ב' מחליף את אותה משמרת - המאזן של א' מוחזר"""
+    coordinator_a = SQLiteStorage(str(tmp_path / 'shibutz.db'))
+    coordinator_b = SQLiteStorage(str(tmp_path / 'shibutz.db'))
+    shift_key = SlotKey('01/03/2026', 'א', 'בוקר', 0)
+    coordinator_a.save_changes({shift_key: 'דני'}, coordinator_a.load_assignments(['01/03/2026']))
+    coordinator_b.save_changes({shift_key: 'רון'}, coordinator_b.load_assignments(['01/03/2026']))
+    assert coordinator_a.load_balance() == {'דני': 0, 'רון': 1}
+
+class FakeBatch:
+    def __init__(self, committed):
+        self._committed = committed
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append((ref.path, data))
+
+    def delete(self, ref):
+        self._ops.append((ref.path, None))
+
+    def commit(self):
+        self._committed.append(self._ops)
+
+class FakeBatchClient(FakeClient):
+    def __init__(self):
+        self.batches = []
+
+    def batch(self):
+        return FakeBatch(self.batches)
+
+def test_firestore_chunks_keep_history_with_assignments(monkeypatch):
+    pytest.importorskip('firebase_admin')
+    monkeypatch.setattr(storage_module, 'FIRESTORE_BATCH_LIMIT', 6)
+    client = FakeBatchClient()
+    storage = FirestoreStorage(client, listen=False)
+    slots = [SlotKey('01/03/2026', 'א', 'בוקר', row) for row in range(5)]
+    committed = {slots[0].to_id(): 'דני', slots[4].to_id(): 'רון'}
+    schedule = {slots[0]: 'רון', slots[1]: 'דני', slots[2]: 'יעל', slots[3]: 'דני'}
+    storage.save_changes(schedule, committed)
+    
+    totals = {}
+    for ops in client.batches:
+        assert len(ops) <= 6
+        # כל חבילה מאוזנת בפני עצמה: עדכוני המאזן שבה הם בדיוק אלה של השיבוצים שבה
+        expected = {}
+        for path, data in ops:
+            if not path.startswith('assignments/'):
+                continue
+            previous = committed.get(path.split('/')[1])
+            for employee, count in ((data and data['employee'], 1), (previous, -1)):
+                if employee:
+                    expected[employee] = expected.get(employee, 0) + count
+        history = {path.split('/')[1]: data['total_shifts'].value
+                   for path, data in ops if path.startswith('employee_history/')}
+        assert history == {e: c for e, c in expected.items() if c}
+        for employee, count in history.items():
+            totals[employee] = totals.get(employee, 0) + count
+    assert {e: c for e, c in totals.items() if c} == {'דני': 1, 'יעל': 1}
+
+def test_firestore_save_deletes_markers(monkeypatch):
+    pytest.importorskip('firebase_admin')
+    monkeypatch.setattr(storage_module, 'FIRESTORE_BATCH_LIMIT', 6)
+    client = FakeBatchClient()
+    storage = FirestoreStorage(client, listen=False)
+    schedule = {SlotKey('01/03/2026', 'א', 'בוקר', row): f'עובד {row}' for row in range(8)}
+    storage.save_changes(schedule, {})
+    
+    written, deleted = set(), set()
+    for ops in client.batches:
+        assert len(ops) <= 6
+        for path, data in ops:
+            if path.startswith('save_batches/'):
+                (deleted if data is None else written).add(path)
+    assert len(written) > 1
+    assert deleted == written